@@ -1,7 +1,89 @@
 
+import io
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from storage import StorageManager
-from planner import StudyPlanner, SubjectManager
-from config import DEFAULT_USER_ID
+from planner import StudyPlanner, SubjectManager, DayScheduler
+from metrics import timed
+from config import DEFAULT_USER_ID, LOG_FILE, AUTOSAVE_ENABLED, AUTOSAVE_QUIET_SECONDS, AUTOSAVE_MAX_MUTATIONS
+
+
+def _log_unexpected_error(choice: str):
+    """Logs the exception being handled, with its traceback, to LOG_FILE."""
+    import logging  # Imported here: it is slow to load and only needed once something goes wrong
+
+    logger = logging.getLogger("study_planner")
+    if not logger.handlers:
+        log_handler = logging.FileHandler(LOG_FILE)
+        log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(log_handler)
+    logger.exception("Unexpected error handling menu choice %r", choice)
+
+
+class Autosaver:
+    """
+    Saves the session's user from a background thread once edits settle:
+    AUTOSAVE_QUIET_SECONDS after the last change, or straight away once
+    AUTOSAVE_MAX_MUTATIONS changes are pending. Nothing is written unless
+    the user is dirty. Make changes inside `with autosaver.editing():`.
+    """
+    def __init__(self, user, quiet_seconds: float = AUTOSAVE_QUIET_SECONDS,
+                 max_mutations: int = AUTOSAVE_MAX_MUTATIONS):
+        self.user = user
+        self.quiet_seconds = quiet_seconds
+        self.max_mutations = max_mutations
+        self.lock = threading.Lock()  # Held while the user is changed or saved
+        self._wake = threading.Event()
+        self._pending = 0
+        self._last_change = 0.0
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="autosaver", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @contextmanager
+    def editing(self):
+        """Holds the lock while the block changes the user and counts the change."""
+        with self.lock:
+            revision = self.user.revision
+            yield
+            if self.user.revision != revision:
+                self._pending += 1
+                self._last_change = time.monotonic()
+                self._wake.set()
+
+    def save_now(self) -> bool:
+        """Writes the user if it has unsaved changes. Returns True if it wrote."""
+        with self.lock:
+            self._pending = 0
+            if not self.user.is_dirty:
+                return False
+            return StorageManager.save_users([self.user], quiet=True)
+
+    def _run(self):
+        while not self._stopped:
+            timeout = None
+            if self._pending:
+                timeout = max(0.0, self._last_change + self.quiet_seconds - time.monotonic())
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._stopped:
+                return
+            if self._pending and (self._pending >= self.max_mutations
+                                  or time.monotonic() - self._last_change >= self.quiet_seconds):
+                self.save_now()
+
 
 class CLI:
     """
@@ -9,12 +91,55 @@ class CLI:
     TODO: Add color support for better UX (maybe use colorama?)
     """
     def __init__(self):
+        # The user is loaded in the background so the menu shows up straight away
+        self._user = None
+        self._autosaver = None
+        self._loaded = None
+        self._loader = threading.Thread(target=self._load_user, name="user-loader", daemon=True)
+        self._loader.start()
+
+    def _load_user(self):
+        try:
+            # load_users prints nothing, so it cannot interleave with the menu
+            self._loaded = StorageManager.load_users([DEFAULT_USER_ID])[DEFAULT_USER_ID]
+        except Exception:
+            self._loaded = None  # The user property retries with load_user and reports why
+
+    @property
+    def user(self):
+        """The session's user; waits for the background load on first use."""
+        if self._user is None:
+            self._loader.join()
+            self.user = self._loaded or StorageManager.load_user(DEFAULT_USER_ID)
+            if AUTOSAVE_ENABLED:
+                self._autosaver.start()
+        return self._user
+
+    @user.setter
+    def user(self, user):
+        self._user = user
+        self._autosaver = Autosaver(user)
+
+    @property
+    def autosaver(self) -> "Autosaver":
+        self.user  # Created together with the user
+        return self._autosaver
+
+    @autosaver.setter
+    def autosaver(self, autosaver: "Autosaver"):
+        self._autosaver = autosaver
 
-        self.user = StorageManager.load_user(DEFAULT_USER_ID)
-        
     def save_and_exit(self):
-        """Save and exit - pretty straightforward"""
-        StorageManager.save_user(self.user)
+        """Save and exit - only writes if something changed since the last save"""
+        if self._user is None:
+            print("\nNo unsaved changes.")  # The user was never used, so nothing changed
+            print("\nThank you for using the Study Planner. Goodbye!")
+            exit()
+        self.autosaver.stop()
+        if self.user.is_dirty:
+            StorageManager.save_user(self.user)
+        else:
+            print("\nNo unsaved changes.")
         print("\nThank you for using the Study Planner. Goodbye!")
         exit()
         
@@ -53,7 +178,7 @@ class CLI:
                 self.save_and_exit()
             except Exception as e:
                 print(f"An unexpected error occurred: {e}")
-                # TODO: Add proper logging here
+                _log_unexpected_error(choice)
 
     def _display_menu(self):
         """Display main menu options"""
@@ -99,12 +224,14 @@ class CLI:
             except ValueError:
                 print("Invalid input. Please enter a number for target hours.")
             
-        SubjectManager.add_subject(self.user, name, weight, target_hours)
+        with self.autosaver.editing():
+            SubjectManager.add_subject(self.user, name, weight, target_hours)
 
     def _remove_subject(self):
         """Remove subject by name"""
         name = input("Enter Subject Name to Remove: ").strip()
-        SubjectManager.remove_subject(self.user, name)
+        with self.autosaver.editing():
+            SubjectManager.remove_subject(self.user, name)
         
     def _input_study_slots(self):
         """
@@ -112,7 +239,7 @@ class CLI:
         Note: This could be optimized to save partial input if user exits
         """
         print("\n--- Input Weekly Study Slots (Available Hours) ---")
-        self.user.study_slots = []
+        study_slots = []
         days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
         
         for day in days:
@@ -120,204 +247,57 @@ class CLI:
                 try:
                     hours = float(input(f"Available hours for {day}: ").strip())
                     if hours >= 0 and hours <= 24:  # basic validation
-                        self.user.study_slots.append(hours)
+                        study_slots.append(hours)
                         break
                     else:
                         print("Hours must be between 0 and 24.")
                 except ValueError:
                     print("Invalid input. Please enter a number for hours.")
-                    
+        
+        with self.autosaver.editing():
+            SubjectManager.set_study_slots(self.user, study_slots)
         total_hours = sum(self.user.study_slots)
         print(f"\nTotal available study hours for the week: {total_hours:.1f} hours.")
 
     def _generate_and_view_plan(self):
         """Generate and display the weekly study plan"""
-        print("\n-----------------------------------------------------")
-        print("              GENERATING WEEKLY STUDY PLAN             ")
-        print("-----------------------------------------------------")
+        out = io.StringIO()
+        out.write("\n-----------------------------------------------------\n")
+        out.write("              GENERATING WEEKLY STUDY PLAN             \n")
+        out.write("-----------------------------------------------------\n")
         
-        plan = StudyPlanner.generate_plan(self.user)
+        plan, daily_plan, allocated_hours_map = StudyPlanner.build_schedule(self.user)
         
         if not plan:
-            print("Plan cannot be generated. Ensure you have added subjects and study slots.")
-            return
-            
-      
-        daily_plan, allocated_hours_map = self._structure_plan_by_day(plan)
-        
-        total_allocated_hours = sum(allocated_hours_map.values())
-        
-        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        
-      
-        print("\n--- Weekly Schedule Details ---")
-        for i, day in enumerate(days):
-            available_hours = self.user.study_slots[i] if i < len(self.user.study_slots) else 0
-            tasks = daily_plan.get(day, [])
-            
-            print(f"\n--- {day} (Available: {available_hours:.1f} hrs) ---")
-            if not tasks:
-                print("   No tasks allocated.")
-                continue
+            out.write("Plan cannot be generated. Ensure you have added subjects and study slots.\n")
+        else:
+            import render
+            render.render_schedule(self.user, daily_plan, allocated_hours_map, out)
+            render.render_report(self.user, allocated_hours_map, out)
+        # One write for the whole screen instead of a print per line
+        sys.stdout.write(out.getvalue())
 
-            current_day_hours = 0.0
-            for task in tasks:
-                print(f"   - {task}")
-                current_day_hours += task.hours_allocated
-                
-            print(f"   (Total allocated for {day}: {current_day_hours:.2f} hrs)")
-
-        print("\n-----------------------------------------------------")
-        print(f"TOTAL ALLOCATED HOURS THIS WEEK: {total_allocated_hours:.2f} hrs")
-        print("-----------------------------------------------------")
-        
- 
-        self._display_analytics_report(allocated_hours_map)
-
-    def _structure_plan_by_day(self, plan: list) -> tuple[dict, dict]:
+    @timed("cli.structure_plan_by_day")
+    def _structure_plan_by_day(self, plan) -> tuple[dict, dict]:
         """
         Distribute tasks across the week
-        This was tricky to get right - had to fix the consecutive hours bug
+        The actual scheduling lives in planner.DayScheduler so batch jobs can use it too
         """
-        daily_plan = {day: [] for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]}
-        allocated_hours_map = {s.name: 0.0 for s in self.user.subjects}
-        
-        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        
-       
-        task_queue = []
-        for task in plan:
-            task_queue.append({
-                'subject': task.subject_name,
-                'topic': task.topic,
-                'remaining_hours': task.hours_allocated
-            })
-        
-      
-        for day_index, day in enumerate(days):
-            if day_index >= len(self.user.study_slots):
-                break
-            
-            available_hours = self.user.study_slots[day_index]
-            if available_hours <= 0:
-                continue
-            
-            hours_used = 0.0
-            last_subject = None
-            consecutive_hours = 0.0
-            day_tasks = []
-            
-            task_index = 0
-            while hours_used < available_hours and task_index < len(task_queue):
-                current_task_data = task_queue[task_index]
-                
-                
-                if current_task_data['remaining_hours'] <= 0.001:
-                    task_index += 1
-                    continue
-                
-             
-                if current_task_data['subject'] == last_subject:
-                    if consecutive_hours >= StudyPlanner.MAX_CONSECUTIVE_HOURS:
-                       
-                        found_different = False
-                        for alt_index in range(task_index + 1, len(task_queue)):
-                            if (task_queue[alt_index]['remaining_hours'] > 0.001 and 
-                                task_queue[alt_index]['subject'] != last_subject):
-                                task_index = alt_index
-                                current_task_data = task_queue[task_index]
-                                found_different = True
-                                break
-                        
-                        if not found_different:
-                            break
-                else:
-                    consecutive_hours = 0.0
-                
-         
-                max_by_task = current_task_data['remaining_hours']
-                max_by_day = available_hours - hours_used
-                max_by_consecutive = StudyPlanner.MAX_CONSECUTIVE_HOURS - consecutive_hours
-                
-                time_to_allocate = min(max_by_task, max_by_day, max_by_consecutive)
-                
-                if time_to_allocate < 0.001:
-                    task_index += 1
-                    continue
-                
-              
-                from models import Task
-                new_task = Task(
-                    current_task_data['subject'],
-                    current_task_data['topic'],
-                    time_to_allocate
-                )
-                
-                day_tasks.append(new_task)
-                hours_used += time_to_allocate
-                consecutive_hours += time_to_allocate
-                allocated_hours_map[current_task_data['subject']] += time_to_allocate
-                
-                current_task_data['remaining_hours'] -= time_to_allocate
-                
-                last_subject = current_task_data['subject']
-                
-                if current_task_data['remaining_hours'] < 0.001:
-                    task_index += 1
-            
-            daily_plan[day] = day_tasks
-        
-        return daily_plan, allocated_hours_map
+        return DayScheduler().schedule(plan, self.user.study_slots, self.user.subjects)
     
     def _display_analytics_report(self, allocated_hours_map: dict):
         """Display target vs allocated analysis"""
-        print("\n=====================================================")
-        print("          ANALYTICAL REPORT: TARGET VS. ALLOCATED      ")
-        print("=====================================================")
-        
-        if not self.user.subjects:
-            print("No subjects to analyze.")
-            return
-        
-        print(f"{'Subject':<20}{'Target Hrs':<12}{'Allocated Hrs':<15}{'Status':<20}")
-        print("-" * 67)
-
-        for subject in self.user.subjects:
-            name = subject.name
-            target = subject.target_hours
-            allocated = allocated_hours_map.get(name, 0.0)
-            
-            status = ""
-            if target > 0:
-                if allocated >= target:
-                    surplus = allocated - target
-                    status = f"✓ MET (+{surplus:.1f}h)"
-                else:
-                    deficit = target - allocated
-                    status = f"✗ DEFICIT (-{deficit:.1f}h)"
-            else:
-                if allocated > 0:
-                    status = "Allocated"
-                else:
-                    status = "Not Scheduled"
-
-            print(f"{name:<20}{target:<12.1f}{allocated:<15.2f}{status:<20}")
-        
-  
-        total_target = sum(s.target_hours for s in self.user.subjects)
-        total_allocated = sum(allocated_hours_map.values())
-        
-        print("-" * 67)
-        print(f"{'TOTAL':<20}{total_target:<12.1f}{total_allocated:<15.2f}")
-        
-        if total_target > 0:
-            completion_rate = (total_allocated / total_target) * 100
-            print(f"\nOverall Progress: {completion_rate:.1f}% of target hours")
-        
-        print("=====================================================\n")
+        import render
+        sys.stdout.write(render.render_report(self.user, allocated_hours_map))
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        import batch
+        sys.exit(batch.main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        import render
+        sys.exit(render.main(sys.argv[2:]))
     app = CLI()
     app.run()
     
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Headless batch mode: python CLI.py batch OPS_FILE [RESULTS_FILE]
+
+OPS_FILE is JSON Lines, one operation per line:
+    {"user_id": "alice", "op": "add_subject", "name": "Math", "weight": 3, "target_hours": 10}
+    {"user_id": "alice", "op": "remove_subject", "name": "Math"}
+    {"user_id": "alice", "op": "set_slots", "slots": [2, 2, 3, 1, 0, 4, 4]}
+    {"user_id": "alice", "op": "generate_plan"}
+
+Operations are streamed line by line. Each user is loaded on its first
+operation and kept in memory; changed users are written together with one
+StorageManager.save_users call at the end (or whenever BATCH_FLUSH_USERS
+users are held, after which the clean ones are dropped too, to bound
+memory). Users changed before an error are still saved. One JSON result
+line is written per operation, followed by a final "save" line; an
+operation that fails reports "error" on its own line and the batch goes
+on. Messages that the interactive CLI would print are returned in the
+"message" field instead. With time slots, generate_plan tasks also carry
+their "HH:MM" start and end.
+"""
+import contextlib
+import io
+import json
+import sys
+from storage import StorageManager
+from planner import StudyPlanner, SubjectManager
+from timeslots import TimedTask, format_time
+from oplog import OperationLog
+
+BATCH_FLUSH_USERS = 1000  # Save changed users and drop all held users once this many are held
+
+
+def _field(op: dict, key: str, kind, default=None):
+    """op[key] checked against kind (a type or tuple of types); raises KeyError/TypeError."""
+    value = op.get(key, default) if default is not None else op[key]
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise TypeError(f"field {key!r} has the wrong type")
+    return value
+
+
+def _task_fields(task) -> list:
+    """[subject, topic, hours], plus "HH:MM" start and end for timed sessions."""
+    fields = [task.subject_name, task.topic, round(task.hours_allocated, 4)]
+    if isinstance(task, TimedTask):
+        fields += [format_time(task.start), format_time(task.end)]
+    return fields
+
+
+def _apply(user, op: dict) -> dict:
+    """Runs one operation against a loaded user and returns its result fields."""
+    kind = op.get("op")
+    if kind == "add_subject":
+        weight = _field(op, "weight", (int, float))
+        if isinstance(weight, float) and not weight.is_integer():
+            raise TypeError("field 'weight' must be a whole number")  # int() would truncate 2.7 to 2
+        ok = SubjectManager.add_subject(user, _field(op, "name", str), int(weight),
+                                        float(_field(op, "target_hours", (int, float), 0.0)))
+        return {"ok": ok, "changed": ok}
+    if kind == "remove_subject":
+        ok = SubjectManager.remove_subject(user, _field(op, "name", str))
+        return {"ok": ok, "changed": ok}
+    if kind == "set_slots":
+        slots = _field(op, "slots", list)
+        if not all(isinstance(h, (int, float)) and not isinstance(h, bool) for h in slots):
+            raise TypeError("field 'slots' must hold numbers")
+        ok = SubjectManager.set_study_slots(user, [float(h) for h in slots])
+        return {"ok": ok, "changed": ok}
+    if kind == "generate_plan":
+        plan, daily_plan, allocated_hours_map = StudyPlanner.build_schedule(user)
+        return {
+            "ok": bool(plan),
+            "changed": False,
+            "plan": {
+                "days": {day: [_task_fields(t) for t in tasks] for day, tasks in daily_plan.items()},
+                "allocated": {name: round(hours, 4) for name, hours in allocated_hours_map.items()},
+            },
+        }
+    raise ValueError(f"unknown op {kind!r}")
+
+
+def run_batch(lines, out) -> bool:
+    """Applies the operations in `lines` and writes JSONL results to `out`. Returns True if everything saved."""
+    users = {}
+    dirty = {}
+    saved_count = 0
+    all_saved = True
+
+    def flush():
+        nonlocal saved_count, all_saved
+        if not dirty:
+            return
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok = StorageManager.save_users(dirty.values(), quiet=True)
+        all_saved = all_saved and ok
+        saved_count += len(dirty) if ok else 0
+        for user_id in dirty:
+            users.pop(user_id, None)
+        dirty.clear()
+
+    # The single save at the end is the durability point, so skip per-change log syncs
+    log_enabled = OperationLog.enabled
+    OperationLog.enabled = False
+    try:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            result = {"line": line_number}
+            messages = io.StringIO()
+            try:
+                op = json.loads(line)
+                if not isinstance(op, dict):
+                    raise TypeError("operation must be a JSON object")
+                result.update(user_id=op.get("user_id"), op=op.get("op"))
+                if not isinstance(op.get("user_id"), str) or not op["user_id"].strip():
+                    raise TypeError("field 'user_id' must be a non-empty string")
+                with contextlib.redirect_stdout(messages):
+                    user = users.get(op["user_id"])
+                    if user is None:
+                        user = users[op["user_id"]] = StorageManager.load_user(op["user_id"])
+                        messages.seek(0)
+                        messages.truncate()  # Load messages are not part of the op's result
+                    outcome = _apply(user, op)
+                if outcome.pop("changed"):
+                    dirty[user.user_id] = user
+                result.update(outcome)
+            except (ValueError, KeyError, TypeError) as e:
+                result.update(ok=False, error=str(e) if not isinstance(e, KeyError) else f"missing field {e}")
+            except Exception as e:  # One bad operation must not cost the rest of the batch
+                result.update(ok=False, error=f"{type(e).__name__}: {e}")
+            message = messages.getvalue().strip()
+            if message:
+                result["message"] = message
+            out.write(json.dumps(result) + "\n")
+
+            if len(users) >= BATCH_FLUSH_USERS:
+                flush()
+                users.clear()  # The rest were only read; reload them if they come up again
+    finally:
+        try:
+            flush()  # Also when the batch stops early: the log is off, so this is the only copy
+        finally:
+            OperationLog.enabled = log_enabled
+
+    out.write(json.dumps({"op": "save", "ok": all_saved, "users": saved_count}) + "\n")
+    out.flush()
+    return all_saved
+
+
+def main(args: list[str]) -> int:
+    if not args or len(args) > 2:
+        print("Usage: python CLI.py batch OPS_FILE [RESULTS_FILE]", file=sys.stderr)
+        return 2
+    ops_path = args[0]
+    results_path = args[1] if len(args) > 1 else "-"
+
+    with contextlib.ExitStack() as stack:
+        lines = sys.stdin if ops_path == "-" else stack.enter_context(open(ops_path, 'r', encoding="utf-8"))
+        out = sys.stdout if results_path == "-" else stack.enter_context(open(results_path, 'w', encoding="utf-8"))
+        return 0 if run_batch(lines, out) else 1
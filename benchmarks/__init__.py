@@ -0,0 +1,9 @@
+"""
+Performance benchmarks for the planner, scheduler and storage hot paths.
+
+    python -m benchmarks.run --out baseline.json
+    python -m benchmarks.run --compare baseline.json
+
+See benchmarks/run.py for the options and benchmarks/datagen.py for the
+synthetic users they run on.
+"""
@@ -0,0 +1,33 @@
+"""Synthetic users for the benchmarks: N users x M subjects x varied slot patterns."""
+import random
+from models import User, Subject
+
+SLOT_PATTERNS = ("uniform", "weekend", "sparse", "random")
+
+
+def make_slots(pattern: str, rng: random.Random) -> list[float]:
+    """Returns a week of study hours shaped like one of SLOT_PATTERNS."""
+    if pattern == "uniform":
+        return [3.0] * 7
+    if pattern == "weekend":
+        return [1.0] * 5 + [6.0, 6.0]
+    if pattern == "sparse":
+        return [rng.choice([0.0, 0.0, 2.5, 4.0]) for _ in range(7)]
+    if pattern == "random":
+        return [round(rng.uniform(0, 8), 2) for _ in range(7)]
+    raise ValueError(f"unknown slot pattern {pattern!r}")
+
+
+def make_user(user_id: str, subject_count: int, rng: random.Random, pattern: str = None) -> User:
+    user = User(user_id)
+    for i in range(subject_count):
+        user.add_subject(Subject(f"Subject {i:03d}", rng.randint(1, 5), float(rng.choice([0, 5, 10, 20]))))
+    user.study_slots = make_slots(pattern or rng.choice(SLOT_PATTERNS), rng)
+    return user
+
+
+def make_users(count: int, subject_count: int, seed: int = 0) -> list[User]:
+    """Deterministic users; slot patterns cycle through SLOT_PATTERNS."""
+    rng = random.Random(seed)
+    return [make_user(f"user_{i:06d}", subject_count, rng, SLOT_PATTERNS[i % len(SLOT_PATTERNS)])
+            for i in range(count)]
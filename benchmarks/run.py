@@ -0,0 +1,209 @@
+"""
+Times the hot paths and reports throughput, p50/p99 latency and peak memory.
+
+    python -m benchmarks.run [--users 200] [--subjects 4,8,32] [--sizes 100,1000,5000]
+                             [--import-runs 5] [--out results.json]
+                             [--compare baseline.json [--threshold 0.10]]
+
+Storage benchmarks run against a JSON data file and a record file
+(record_format.py) of each --sizes user count inside a temporary directory, so the real study_data.json is never touched.
+Peak memory is measured in a separate tracemalloc pass because tracing slows
+the timed calls down. Cold-start cost is the cumulative time
+`python -X importtime` reports for importing each of IMPORT_MODULES in a
+fresh interpreter. With --compare, p50 latencies are checked against a
+previous --out file and the exit status is 1 if any got slower than the
+threshold allows.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.datagen import make_users
+from planner import StudyPlanner
+import storage
+from storage import StorageManager
+from CLI import CLI
+
+IMPORT_MODULES = ("CLI", "server")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func, args_list: list, memory_samples: int = 20) -> dict:
+    """Calls func(*args) for every entry of args_list and summarizes the timings."""
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for args in args_list:
+            t0 = time.perf_counter_ns()
+            func(*args)
+            timings.append(time.perf_counter_ns() - t0)
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        for args in args_list[:memory_samples]:
+            func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "calls": len(timings),
+        "p50_ms": _percentile(timings, 0.50) / 1e6,
+        "p99_ms": _percentile(timings, 0.99) / 1e6,
+        "ops_per_sec": len(timings) / elapsed if elapsed else 0.0,
+        "peak_kib": peak / 1024,
+    }
+
+
+def bench_planner(user_count: int, subject_counts: list[int], seed: int) -> dict:
+    results = {}
+    for subject_count in subject_counts:
+        users = make_users(user_count, subject_count, seed)
+        results[f"generate_plan[subjects={subject_count}]"] = measure(
+            StudyPlanner.generate_plan, [(u,) for u in users])
+
+        plans = []
+        for user in users:
+            cli = CLI.__new__(CLI)  # Skip __init__, which loads the default user from disk
+            cli._user = user  # Not the user setter, which also creates an Autosaver
+            plans.append((cli, StudyPlanner.generate_plan(user)))
+        results[f"structure_plan_by_day[subjects={subject_count}]"] = measure(CLI._structure_plan_by_day, plans)
+    return results
+
+
+def bench_storage(sizes: list[int], calls: int, subject_count: int, seed: int,
+                  backends: tuple = ("json", "records")) -> dict:
+    results = {}
+    rng = random.Random(seed)
+    old_cwd = os.getcwd()
+    old_backend = storage.STORAGE_BACKEND
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for backend in backends:
+                storage.STORAGE_BACKEND = backend
+                # The JSON backend keeps its original names so older baselines still compare
+                tag = "" if backend == "json" else f"backend={backend},"
+                for size in sizes:
+                    users = make_users(size, subject_count, seed)
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        StorageManager.save_users(users, quiet=True)
+                    picks = [(rng.choice(users).user_id,) for _ in range(calls)]
+                    results[f"load_user[{tag}file_users={size}]"] = measure(StorageManager.load_user, picks)
+                    picks = [(rng.choice(users),) for _ in range(calls)]
+                    results[f"save_user[{tag}file_users={size}]"] = measure(StorageManager.save_user, picks)
+                    for name in os.listdir(tmp):
+                        os.remove(os.path.join(tmp, name))
+        finally:
+            storage.STORAGE_BACKEND = old_backend
+            os.chdir(old_cwd)
+    return results
+
+
+def import_time_us(module: str) -> int:
+    """Cumulative import time of `module` in microseconds, from a fresh `python -X importtime`."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    for line in reversed(completed.stderr.splitlines()):
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise RuntimeError(f"no importtime line for {module}")
+
+
+def bench_imports(runs: int) -> dict:
+    results = {}
+    for module in IMPORT_MODULES:
+        timings = sorted(import_time_us(module) for _ in range(runs))
+        p50_ms = _percentile(timings, 0.50) / 1e3
+        results[f"import_time[{module}]"] = {
+            "calls": runs,
+            "p50_ms": p50_ms,
+            "p99_ms": _percentile(timings, 0.99) / 1e3,
+            "ops_per_sec": 1e3 / p50_ms if p50_ms else 0.0,
+            "peak_kib": 0.0,
+        }
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Returns one line per benchmark whose p50 grew by more than `threshold` (a fraction)."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["p50_ms"]:
+            continue
+        change = current["p50_ms"] / previous["p50_ms"] - 1
+        if change > threshold:
+            regressions.append(f"{name}: p50 {previous['p50_ms']:.4f} ms -> {current['p50_ms']:.4f} ms (+{change:.0%})")
+    return regressions
+
+
+def print_report(results: dict, baseline: dict = None):
+    print(f"{'benchmark':<46}{'calls':>7}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>10}{'vs base':>9}")
+    for name, r in results.items():
+        delta = ""
+        if baseline and name in baseline and baseline[name]["p50_ms"]:
+            delta = f"{r['p50_ms'] / baseline[name]['p50_ms'] - 1:+.0%}"
+        print(f"{name:<46}{r['calls']:>7}{r['ops_per_sec']:>12.0f}{r['p50_ms']:>10.4f}"
+              f"{r['p99_ms']:>10.4f}{r['peak_kib']:>10.1f}{delta:>9}")
+
+
+def _int_list(text: str) -> list[int]:
+    return [int(part) for part in text.split(",") if part]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Study Planner benchmarks")
+    parser.add_argument("--users", type=int, default=200, help="users per planner benchmark")
+    parser.add_argument("--subjects", type=_int_list, default=[4, 8, 32], help="subject counts, e.g. 4,8,32")
+    parser.add_argument("--sizes", type=_int_list, default=[100, 1000, 5000], help="users in the data file")
+    parser.add_argument("--calls", type=int, default=50, help="load/save calls per data file size")
+    parser.add_argument("--import-runs", type=int, default=5, help="fresh interpreters per import timing (0 = skip)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON written by an earlier --out")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed p50 slowdown (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    results = bench_planner(args.users, args.subjects, args.seed)
+    results.update(bench_storage(args.sizes, args.calls, 8, args.seed))
+    if args.import_runs:
+        results.update(bench_imports(args.import_runs))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)["results"]
+    print_report(results, baseline)
+
+    if args.out:
+        meta = {"python": platform.python_version(), "platform": platform.platform(),
+                "users": args.users, "subjects": args.subjects, "sizes": args.sizes,
+                "calls": args.calls, "import_runs": args.import_runs, "seed": args.seed}
+        with open(args.out, 'w') as f:
+            json.dump({"meta": meta, "results": results}, f, indent=4)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
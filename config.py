@@ -1,6 +1,51 @@
 
 DATA_FILE = "study_data.json"
 
+# Storage backend: "json" keeps every user in DATA_FILE, "sharded" spreads
+# users over SHARD_COUNT small files inside SHARD_DIR, "sqlite" uses SQLITE_FILE,
+# "records" uses the compressed, chunked RECORDS_FILE (record_format.py).
+STORAGE_BACKEND = "json"
+SHARD_DIR = "study_data.d"
+SHARD_COUNT = 64  # Only used when a new shard directory is created
+SQLITE_FILE = "study_data.db"
+RECORDS_FILE = "study_data.rec"
+RECORDS_COMPRESSION = "zlib"  # "zlib", "lzma" or "none", applied per chunk
+RECORDS_CHUNK_BYTES = 64 * 1024  # Uncompressed size of a chunk; loading a user inflates one chunk
+
+# Append-only log of subject/slot changes (DATA_FILE + ".wal"), replayed on load
+WAL_ENABLED = True
+WAL_COMPACT_BYTES = 256 * 1024  # Fold the log into the snapshot past this size
+
+# How generate_plan splits the week: "proportional" (by weight) or "target"
+# (smallest weighted shortfall against target_hours in the scheduled week)
+ALLOCATION_STRATEGY = "proportional"
+
+# Built schedules are cached per user until the subjects or slots change
+PLAN_CACHE_SIZE = 128  # Users kept in memory
+PLAN_CACHE_DISK = False  # Also keep schedules in DATA_FILE + ".plans/"
+
+# Local HTTP service (python server.py)
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_CACHE_SIZE = 1024  # Users kept in memory between requests
+SERVER_FLUSH_INTERVAL = 2.0  # Seconds between write-behind saves
+SERVER_PLAN_WORKERS = 2  # Planning processes (0 = plan on threads)
+
+# Timing instrumentation (metrics.py); STUDY_PLANNER_METRICS=1 also enables it
+METRICS_ENABLED = False
+METRICS_FORMAT = "text"  # "text" or "prometheus"
+METRICS_OUTPUT = "-"  # Written at exit; "-" is stderr
+
+LOG_FILE = "study_planner.log"  # Unexpected CLI errors are logged here
+
+# The CLI saves in the background once edits pause or pile up
+AUTOSAVE_ENABLED = True
+AUTOSAVE_QUIET_SECONDS = 5.0  # Save this long after the last change
+AUTOSAVE_MAX_MUTATIONS = 10  # ...or as soon as this many changes are pending
+
+# JSON catalog of study resources for recommendations (None = built-in list)
+RECOMMENDATIONS_FILE = None
+
 DEFAULT_USER_ID = "student_user"
 
 APP_VERSION = "1.0.0"
@@ -9,5 +54,4 @@ MAX_CONSECUTIVE_HOURS = 2.0  # Max hours for same subject in one sitting
 MIN_TASK_DURATION = 0.25  # Minimum 15 minutes per task
 MAX_DAILY_STUDY_HOURS = 16  # Realistic max (nobody studies 24hrs!)
 
-# TODO: Add configuration for themes/colors
-# TODO: Add support for custom recommendations
\ No newline at end of file
+# TODO: Add configuration for themes/colors
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Planning over a date range (e.g. a 16-week semester) instead of one week.
+
+A day's available hours come from User.slot_overrides when the date has an
+override, otherwise from the weekly template User.study_slots (Monday first).
+Weeks are planned one at a time, only when the generator is advanced, so a
+long horizon never holds more than one week of tasks in memory.
+
+Each subject's target_hours is treated as its goal for the whole horizon and
+spread over the weeks in proportion to their available hours; whatever a week
+has left over is split by weight, like the single-week planner does.
+"""
+from datetime import date, timedelta
+from models import User
+from planner import StudyPlanner, DayScheduler
+
+
+def _as_date(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+class HorizonPlanner:
+    """Lays out study sessions from `start` to `end` (inclusive), one week at a time."""
+
+    def __init__(self, user: User, start, end, scheduler: DayScheduler = None):
+        self.user = user
+        self.start = _as_date(start)
+        self.end = _as_date(end)
+        if self.end < self.start:
+            raise ValueError("end date is before start date")
+        self.scheduler = scheduler or DayScheduler()
+
+    @classmethod
+    def for_weeks(cls, user: User, start, weeks: int, scheduler: DayScheduler = None):
+        start = _as_date(start)
+        return cls(user, start, start + timedelta(days=7 * weeks - 1), scheduler)
+
+    def available_hours(self, day: date) -> float:
+        override = self.user.slot_overrides.get(day.isoformat())
+        if override is not None:
+            return override
+        slots = self.user.study_slots
+        return slots[day.weekday()] if day.weekday() < len(slots) else 0.0
+
+    def week_dates(self):
+        """Yields the dates of each week (7 days from start; the last may be shorter)."""
+        week_start = self.start
+        while week_start <= self.end:
+            days = (min(self.end, week_start + timedelta(days=6)) - week_start).days + 1
+            yield [week_start + timedelta(days=i) for i in range(days)]
+            week_start += timedelta(days=7)
+
+    def weeks(self):
+        """
+        Yields (plan, daily_plan, allocated_hours_map) for each week, where
+        daily_plan is {date: [Task]}, the same shape as StudyPlanner.build_schedule.
+        """
+        subjects = list(self.user.subjects)
+        if not subjects:
+            return
+        names = [s.name for s in subjects]
+        remaining_target = {s.name: s.target_hours for s in subjects}
+        # Only per-week totals are computed up front, never the sessions themselves
+        capacities = [sum(self.available_hours(d) for d in dates) for dates in self.week_dates()]
+        remaining_capacity = sum(capacities)
+
+        for dates, capacity in zip(self.week_dates(), capacities):
+            hours = [self.available_hours(d) for d in dates]
+            allocations = self._allocate_week(subjects, remaining_target, capacity, remaining_capacity)
+            remaining_capacity -= capacity
+
+            plan = StudyPlanner.plan_from_allocations(names, allocations)
+            daily_plan, allocated_hours_map = self.scheduler.schedule(plan, hours, subjects, day_names=dates)
+            for name, scheduled in allocated_hours_map.items():
+                remaining_target[name] = max(0.0, remaining_target[name] - scheduled)
+            yield plan, daily_plan, allocated_hours_map
+
+    def sessions(self):
+        """Yields (date, Task) for the whole horizon, in order."""
+        for _, daily_plan, _ in self.weeks():
+            for day, tasks in daily_plan.items():
+                for task in tasks:
+                    yield day, task
+
+    @staticmethod
+    def _allocate_week(subjects, remaining_target: dict, capacity: float, remaining_capacity: float) -> dict:
+        """This week's share of each remaining target, plus spare hours split by weight."""
+        if capacity <= 0 or remaining_capacity <= 0:
+            return {}
+        share = capacity / remaining_capacity
+        allocations = {s.name: remaining_target[s.name] * share for s in subjects}
+        committed = sum(allocations.values())
+        if committed > capacity:
+            # Targets no longer fit in the remaining horizon: scale them down
+            allocations = {name: hours * capacity / committed for name, hours in allocations.items()}
+            return allocations
+
+        spare = StudyPlanner.split_hours([s.name for s in subjects], [s.weight for s in subjects],
+                                         [capacity - committed])
+        for name, hours in spare.items():
+            allocations[name] += hours
+        return allocations
@@ -0,0 +1,197 @@
+"""
+Opt-in timing instrumentation for the planner, scheduler and storage.
+
+Enable it with METRICS_ENABLED in config.py or the STUDY_PLANNER_METRICS
+environment variable ("1"/"text" for a plain report, "prometheus" for the
+Prometheus text format). When enabled, timings are collected in-process and
+written to METRICS_OUTPUT ("-" for stderr) when the program exits; call
+Metrics.dump() or Metrics.render() to get them on demand.
+
+    with Metrics.span("storage.json_decode"):
+        data = json.load(f)
+
+    @timed("planner.generate_plan")
+    def generate_plan(user): ...
+
+While disabled, span() returns a shared no-op context manager and timed()
+functions only check one flag, so the instrumentation costs close to nothing.
+Plans built in worker processes (StudyPlanner.generate_plans) are not counted.
+"""
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from config import METRICS_ENABLED, METRICS_FORMAT, METRICS_OUTPUT
+
+_ENV_SETTING = os.environ.get("STUDY_PLANNER_METRICS", "").strip().lower()
+_NULL_SPAN = nullcontext()
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (max for the +Inf bucket)."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        Metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """Process-wide counters and timing histograms."""
+    enabled = METRICS_ENABLED or _ENV_SETTING not in ("", "0", "false", "off")
+    output_format = "prometheus" if _ENV_SETTING == "prometheus" else METRICS_FORMAT
+
+    _lock = threading.Lock()
+    _counters = {}
+    _histograms = {}
+
+    @staticmethod
+    def span(name: str):
+        """Context manager that records how long its block takes under `name`."""
+        return _Span(name) if Metrics.enabled else _NULL_SPAN
+
+    @staticmethod
+    def increment(name: str, value: float = 1):
+        if not Metrics.enabled:
+            return
+        with Metrics._lock:
+            Metrics._counters[name] = Metrics._counters.get(name, 0) + value
+
+    @staticmethod
+    def observe(name: str, seconds: float):
+        with Metrics._lock:
+            histogram = Metrics._histograms.get(name)
+            if histogram is None:
+                histogram = Metrics._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @staticmethod
+    def reset():
+        with Metrics._lock:
+            Metrics._counters.clear()
+            Metrics._histograms.clear()
+
+    @staticmethod
+    def render(output_format: str = None) -> str:
+        """Returns the collected metrics as "text" or "prometheus"."""
+        output_format = output_format or Metrics.output_format
+        with Metrics._lock:
+            counters = dict(Metrics._counters)
+            histograms = {name: (h.counts[:], h.count, h.total, h.max, h.quantile(0.5), h.quantile(0.99))
+                          for name, h in Metrics._histograms.items()}
+        if output_format == "prometheus":
+            return _render_prometheus(counters, histograms)
+        return _render_text(counters, histograms)
+
+    @staticmethod
+    def dump(path: str = None, output_format: str = None):
+        """Writes render() to path (default METRICS_OUTPUT; "-" means stderr)."""
+        path = path or METRICS_OUTPUT
+        report = Metrics.render(output_format)
+        if path == "-":
+            sys.stderr.write(report)
+        else:
+            with open(path, 'w') as f:
+                f.write(report)
+
+
+def timed(name: str):
+    """Decorator form of Metrics.span."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not Metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                Metrics.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def _render_text(counters: dict, histograms: dict) -> str:
+    lines = ["--- Study Planner metrics ---"]
+    if histograms:
+        lines.append(f"{'span':<36}{'count':>8}{'total ms':>12}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, (_, count, total, peak, p50, p99) in sorted(histograms.items()):
+            lines.append(f"{name:<36}{count:>8}{total * 1e3:>12.3f}{total / count * 1e3:>10.3f}"
+                         f"{p50 * 1e3:>10.3f}{p99 * 1e3:>10.3f}{peak * 1e3:>10.3f}")
+    for name, value in sorted(counters.items()):
+        lines.append(f"{name:<36}{value:>8}")
+    return "\n".join(lines) + "\n"
+
+
+def _prometheus_name(name: str) -> str:
+    import re  # Only needed for this output format
+
+    return "study_planner_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _render_prometheus(counters: dict, histograms: dict) -> str:
+    lines = []
+    for name, value in sorted(counters.items()):
+        metric = _prometheus_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, (counts, count, total, _, _, _) in sorted(histograms.items()):
+        metric = _prometheus_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+        lines += [f"{metric}_sum {total}", f"{metric}_count {count}"]
+    return "\n".join(lines) + "\n"
+
+
+def _dump_at_exit():
+    if Metrics.enabled and (Metrics._counters or Metrics._histograms):
+        try:
+            Metrics.dump()
+        except OSError as e:
+            print(f"Warning: could not write metrics: {e}", file=sys.stderr)
+
+
+atexit.register(_dump_at_exit)
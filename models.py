@@ -1,9 +1,14 @@
 
 
 import json
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
 
 class Subject:
     """Represents a course or subject a user is studying."""
+    __slots__ = ("name", "weight", "target_hours")
+
     def __init__(self, name: str, weight: int, target_hours: float = 0.0):
        
         self.name = name
@@ -27,6 +32,8 @@ class Subject:
 
 class Task:
     """Represents a planned study activity or recommendation."""
+    __slots__ = ("subject_name", "topic", "hours_allocated")
+
     def __init__(self, subject_name: str, topic: str, hours_allocated: float):
         self.subject_name = subject_name
         self.topic = topic
@@ -39,24 +46,317 @@ class Task:
         """Creates a deep copy of the task to avoid mutation issues."""
         return Task(self.subject_name, self.topic, self.hours_allocated)
 
+class SubjectTable:
+    """
+    Column-oriented subjects for holding many users in memory: interned names
+    plus parallel array('d') columns for weight and target_hours, instead of
+    one Subject object per subject.
+    """
+    __slots__ = ("names", "weights", "target_hours")
+
+    def __init__(self, subjects: list[Subject] = ()):
+        self.names: list[str] = []
+        self.weights = array('d')
+        self.target_hours = array('d')
+        for s in subjects:
+            self.append(s.name, s.weight, s.target_hours)
+
+    def append(self, name: str, weight: int, target_hours: float = 0.0):
+        self.names.append(sys.intern(name))
+        self.weights.append(weight)
+        self.target_hours.append(target_hours)
+
+    def __len__(self):
+        return len(self.names)
+
+    def to_subjects(self) -> list[Subject]:
+        return [Subject(name, _as_number(weight), target)
+                for name, weight, target in zip(self.names, self.weights, self.target_hours)]
+
+    def to_dict(self) -> list[dict]:
+        """Same layout as [s.to_dict() for s in subjects]."""
+        return [s.to_dict() for s in self.to_subjects()]
+
+    @classmethod
+    def from_dict(cls, data: list[dict]):
+        table = cls()
+        for s in data:
+            table.append(s['name'], s['weight'], s.get('target_hours', 0.0))
+        return table
+
+class SubjectList(list):
+    """
+    User.subjects: a list view over the user's name index. Edits made through
+    the list are written back to the index, so direct changes keep working;
+    append is O(1), any other in-place edit rebuilds the index.
+    """
+    __slots__ = ("_owner",)
+
+    def __init__(self, owner, subjects=()):
+        super().__init__(subjects)
+        self._owner = owner
+
+    def append(self, subject: Subject):
+        super().append(subject)
+        owner = self._owner
+        if owner._subject_list is not self:
+            return  # An old view, replaced after a removal: now just a list
+        key = subject.name.casefold()
+        if key in owner._subject_index:
+            owner._adopt(self)  # A duplicate name: the index keeps the last one, like a rebuild
+        else:
+            owner._subject_index[key] = subject
+
+
+def _writing_back(name: str):
+    method = getattr(list, name)
+
+    def write_back(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        if self._owner._subject_list is self:
+            self._owner._adopt(self)
+        return result
+
+    write_back.__name__ = name
+    return write_back
+
+
+for _name in ("__setitem__", "__delitem__", "__iadd__", "__imul__", "extend", "insert", "pop", "remove",
+              "clear", "sort", "reverse"):
+    setattr(SubjectList, _name, _writing_back(_name))
+
+
+def _as_number(value: float):
+    """Gives whole-number weights back as ints so to_dict output is unchanged."""
+    return int(value) if value.is_integer() else value
+
+class StudyPlan:
+    """
+    A study plan stored as runs of identical tasks instead of one Task per hour.
+    Each run is (subject_name, topic, hours, count); Task objects are only
+    created when the plan is iterated, e.g. for display.
+    """
+    __slots__ = ("runs", "notes", "_length")
+
+    def __init__(self):
+        self.runs: list[tuple[str, str, float, int]] = []
+        self.notes: dict[str, str] = {}  # Subject -> recommendation shown on its first task
+        self._length = 0
+
+    def add_run(self, subject_name: str, topic: str, hours: float, count: int = 1):
+        """Appends `count` tasks of `hours` each, merging with the previous run when identical."""
+        if count <= 0:
+            return
+        if self.runs:
+            last_subject, last_topic, last_hours, last_count = self.runs[-1]
+            if last_subject == subject_name and last_topic == topic and last_hours == hours:
+                self.runs[-1] = (last_subject, last_topic, last_hours, last_count + count)
+                self._length += count
+                return
+        self.runs.append((sys.intern(subject_name), sys.intern(topic), hours, count))
+        self._length += count
+
+    def sort_by_subject(self):
+        """Stable sort of the runs by subject name."""
+        self.runs.sort(key=lambda run: run[0])
+
+    def replace_subject_runs(self, subject_name: str, runs: list[tuple[str, str, float, int]]):
+        """Swaps one subject's runs in a plan sorted by subject; O(log R) to find them."""
+        start = bisect_left(self.runs, subject_name, key=lambda run: run[0])
+        end = bisect_right(self.runs, subject_name, lo=start, key=lambda run: run[0])
+        self._length += sum(run[3] for run in runs) - sum(run[3] for run in self.runs[start:end])
+        self.runs[start:end] = [(sys.intern(s), sys.intern(topic), hours, count) for s, topic, hours, count in runs]
+
+    def subject_names(self) -> list[str]:
+        """Subjects in plan order, without duplicates."""
+        return list(dict.fromkeys(run[0] for run in self.runs))
+
+    def hours_by_subject(self) -> dict[str, float]:
+        totals = {}
+        for subject_name, _, hours, count in self.runs:
+            totals[subject_name] = totals.get(subject_name, 0.0) + hours * count
+        return totals
+
+    def __len__(self):
+        return self._length
+
+    def display_runs(self):
+        """Yields the runs with each subject's note applied to its first task."""
+        noted = set()
+        for subject_name, topic, hours, count in self.runs:
+            if subject_name in self.notes and subject_name not in noted:
+                noted.add(subject_name)
+                yield subject_name, f"{topic} ({self.notes[subject_name]})", hours, 1
+                count -= 1
+            if count:
+                yield subject_name, topic, hours, count
+
+    def __iter__(self):
+        for subject_name, topic, hours, count in self.display_runs():
+            for _ in range(count):
+                yield Task(subject_name, topic, hours)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("plan index out of range")
+        for i, task in enumerate(self):
+            if i == index:
+                return task
+
+    def __eq__(self, other):
+        if not isinstance(other, (StudyPlan, list)):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        return all(
+            (a.subject_name, a.topic, a.hours_allocated) == (b.subject_name, b.topic, b.hours_allocated)
+            for a, b in zip(self, other)
+        )
+
+    def __repr__(self):
+        return f"StudyPlan({len(self.runs)} runs, {self._length} tasks)"
+
 class User:
     """The main entity holding the user's data."""
+    __slots__ = ("user_id", "_study_slots", "slot_overrides", "time_slots", "_dirty_fields", "_revision",
+                 "_subject_index", "_subject_list", "log_position")
+
     def __init__(self, user_id: str):
         self.user_id = user_id
-        self.subjects: list[Subject] = []
-        self.study_slots: list[float] = [] 
+        # Casefolded name -> Subject in list order; the source of truth for self.subjects
+        self._subject_index: dict[str, Subject] = {}
+        self._subject_list: SubjectList | None = None  # Built from the index on first use
+        self._study_slots: list[float] = []
+        # Hours for specific dates ("YYYY-MM-DD") that differ from the weekly study_slots
+        self.slot_overrides: dict[str, float] = {}
+        # Optional per-weekday intervals such as ["09:00-11:30"]; study_slots holds their hours
+        self.time_slots: list[list[str]] = []
+        # Fields changed since the last save; _revision counts every change
+        self._dirty_fields: set[str] = set()
+        self._revision = 0
+        # How far into the operation log this object was replayed when it was loaded
+        self.log_position = 0
+
+    @property
+    def subjects(self) -> list[Subject]:
+        if self._subject_list is None:
+            self._subject_list = SubjectList(self, self._subject_index.values())
+        return self._subject_list
+
+    @subjects.setter
+    def subjects(self, subjects: list[Subject]):
+        self._subject_list = SubjectList(self, subjects)
+        self._adopt(self._subject_list)
+
+    def _adopt(self, subjects: list[Subject]):
+        """Rebuilds the name index from a list of subjects (the last of a repeated name wins)."""
+        self._subject_index = {s.name.casefold(): s for s in subjects}
+
+    def __getstate__(self):
+        # The list view points back at this user; it is rebuilt from the index after unpickling
+        return {name: getattr(self, name) for name in self.__slots__ if name != "_subject_list"}
+
+    def __setstate__(self, state: dict):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._subject_list = None
+
+    @property
+    def study_slots(self) -> list[float]:
+        return self._study_slots
+
+    @study_slots.setter
+    def study_slots(self, slots: list[float]):
+        # Assign a new list to change slots; in-place edits are not tracked
+        self._study_slots = slots
+        self.mark_dirty("study_slots")
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self._dirty_fields)
+
+    @property
+    def dirty_fields(self) -> frozenset:
+        return frozenset(self._dirty_fields)
+
+    @property
+    def revision(self) -> int:
+        return self._revision
+
+    def mark_dirty(self, field: str):
+        self._dirty_fields.add(field)
+        self._revision += 1
+
+    def mark_clean(self, revision: int = None):
+        """Forgets pending changes, unless `revision` is given and the user changed since then."""
+        if revision is None or revision == self._revision:
+            self._dirty_fields.clear()
+
+    def set_slot_override(self, day: str, hours: float | None):
+        """Sets the study hours for one date ("YYYY-MM-DD"); None goes back to the weekly slot."""
+        if hours is None:
+            if self.slot_overrides.pop(day, None) is None:
+                return
+        else:
+            self.slot_overrides[day] = hours
+        self.mark_dirty("slot_overrides")
+
+    def set_time_slots(self, time_slots: list[list[str]], hours: list[float]):
+        """Sets the weekday intervals together with the hours they add up to."""
+        self.time_slots = [list(day) for day in time_slots]
+        self.study_slots = list(hours)
+        self.mark_dirty("time_slots")
+
+    def find_subject(self, name: str) -> Subject | None:
+        """Case-insensitive lookup by subject name, O(1)."""
+        return self._subject_index.get(name.casefold())
+
+    def add_subject(self, subject: Subject) -> bool:
+        """Appends a subject unless one with the same name (ignoring case) exists. O(1)."""
+        key = subject.name.casefold()
+        if key in self._subject_index:
+            return False
+        self._subject_index[key] = subject
+        if self._subject_list is not None:
+            list.append(self._subject_list, subject)
+        self.mark_dirty("subjects")
+        return True
+
+    def remove_subject(self, name: str) -> Subject | None:
+        """
+        Removes and returns the subject with this name (ignoring case), if any.
+        O(1): the subjects list is rebuilt from the index when next used.
+        """
+        subject = self._subject_index.pop(name.casefold(), None)
+        if subject is not None:
+            self._subject_list = None
+            self.mark_dirty("subjects")
+        return subject
 
     def to_dict(self):
-        return {
+        data = {
             "user_id": self.user_id,
             "subjects": [s.to_dict() for s in self.subjects],
             "study_slots": self.study_slots
         }
+        # Left out when unused, so existing records are unchanged
+        if self.slot_overrides:
+            data["slot_overrides"] = self.slot_overrides
+        if self.time_slots:
+            data["time_slots"] = self.time_slots
+        return data
 
     @classmethod
     def from_dict(cls, data):
         user = cls(data['user_id'])
         user.subjects = [Subject.from_dict(s) for s in data.get('subjects', [])]
         user.study_slots = data.get('study_slots', [])
+        user.slot_overrides = dict(data.get('slot_overrides', {}))
+        user.time_slots = [list(day) for day in data.get('time_slots', [])]
+        user.mark_clean()  # Matches what is stored
         return user 
       
\ No newline at end of file
@@ -0,0 +1,253 @@
+import contextlib
+import json
+import os
+import threading
+from models import Subject
+from config import DATA_FILE, WAL_ENABLED, WAL_COMPACT_BYTES
+
+
+class OperationLog:
+    """
+    Append-only log of user mutations (add_subject, remove_subject, set_slots,
+    set_override, set_time_slots)
+    kept next to DATA_FILE. Every entry is synced to disk when it is written,
+    so changes survive a crash even if the user was never saved.
+
+    Saving a user appends a "checkpoint" entry for it; loading a user replays
+    the entries after its last checkpoint. Once the log grows past
+    WAL_COMPACT_BYTES it is folded into the snapshot in a background thread.
+
+    Several processes may share the log. Reads, appends and compaction hold
+    its file lock, and positions keep counting across compactions (a "base"
+    line at the top of a compacted log holds the position it starts at). A
+    checkpoint only covers the entries its user had been replayed up to when
+    it was loaded, plus the saving process's own entries, so changes logged
+    by another process stay pending.
+
+    `enabled` only controls whether new changes are logged; an existing log
+    is always replayed and checkpointed so no logged change is lost.
+    """
+    enabled = WAL_ENABLED
+
+    _lock = threading.RLock()
+    _depth = 0  # Nesting of _locked() in the thread holding _lock
+    _fd = None
+    _fd_path = None
+    _compacting = False
+    _writer = None
+    _writer_pid = None
+
+    @staticmethod
+    def path() -> str:
+        return DATA_FILE + ".wal"
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _locked():
+        """Holds the log against other threads and processes; re-entrant within a thread."""
+        from storage import file_lock  # storage imports this module
+
+        with OperationLog._lock:
+            OperationLog._depth += 1
+            try:
+                if OperationLog._depth == 1:
+                    with file_lock(OperationLog.path()):
+                        yield
+                else:
+                    yield
+            finally:
+                OperationLog._depth -= 1
+
+    @staticmethod
+    def _writer_id() -> str:
+        """Tags this process's entries (a fresh id after a fork)."""
+        if OperationLog._writer_pid != os.getpid():
+            OperationLog._writer = f"{os.getpid()}-{os.urandom(4).hex()}"
+            OperationLog._writer_pid = os.getpid()
+        return OperationLog._writer
+
+    @staticmethod
+    def _open() -> int:
+        """Returns the append-mode descriptor for the log, reopening it if DATA_FILE moved or the log was compacted."""
+        path = os.path.abspath(OperationLog.path())
+        if OperationLog._fd is not None and OperationLog._fd_path == path:
+            try:
+                if os.stat(path).st_ino == os.fstat(OperationLog._fd).st_ino:
+                    return OperationLog._fd
+            except FileNotFoundError:
+                pass
+        OperationLog._close()
+        OperationLog._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        OperationLog._fd_path = path
+        return OperationLog._fd
+
+    @staticmethod
+    def _close():
+        if OperationLog._fd is not None:
+            os.close(OperationLog._fd)
+        OperationLog._fd = None
+        OperationLog._fd_path = None
+
+    @staticmethod
+    def _write(entries: list) -> int:
+        """Appends entries with a single write + sync. Returns the new log size."""
+        data = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries).encode("utf-8")
+        with OperationLog._locked():
+            fd = OperationLog._open()
+            os.write(fd, data)
+            if hasattr(os, "fdatasync"):
+                os.fdatasync(fd)
+            else:
+                os.fsync(fd)
+            return os.fstat(fd).st_size
+
+    @staticmethod
+    def append(user_id: str, op: str, **args):
+        """Durably records one mutation of a user."""
+        if not OperationLog.enabled:
+            return
+        size = OperationLog._write([{"user_id": user_id, "op": op, "args": args, "by": OperationLog._writer_id()}])
+        if size > WAL_COMPACT_BYTES:
+            OperationLog.compact_in_background()
+
+    @staticmethod
+    def checkpoint(users):
+        """Marks the given (just saved) users as contained in the snapshot."""
+        users = list(users)
+        if not users:
+            return
+        with OperationLog._locked():
+            _, header, size = OperationLog._extent()
+            if size <= header:
+                return  # Nothing pending for anyone
+            writer = OperationLog._writer_id()
+            OperationLog._write([{"user_id": u.user_id, "op": "checkpoint", "upto": u.log_position, "by": writer}
+                                 for u in users])
+
+    @staticmethod
+    def _extent() -> tuple[int, int, int]:
+        """Returns (position of the log's first byte, size of its "base" line, file size)."""
+        try:
+            with open(OperationLog.path(), 'rb') as f:
+                first = f.readline()
+                size = os.fstat(f.fileno()).st_size
+        except FileNotFoundError:
+            return 0, 0, 0
+        try:
+            entry = json.loads(first)
+        except ValueError:
+            return 0, 0, size
+        if isinstance(entry, dict) and entry.get("op") == "base":
+            return entry["position"], len(first), size
+        return 0, 0, size
+
+    @staticmethod
+    def _read_pending() -> tuple[dict, int]:
+        """
+        Returns ({user_id: [entries after that user's last checkpoint]}, end
+        position). Call with the log locked.
+        """
+        pending = {}
+        position = 0
+        try:
+            with open(OperationLog.path(), 'rb') as f:
+                for line in f:
+                    start = position
+                    position += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn write from a crash; later entries are still usable
+                    op = entry.get("op")
+                    if op == "base" and start == 0:
+                        position = entry["position"] + len(line)
+                    elif op == "checkpoint":
+                        entries = pending.get(entry.get("user_id"), [])
+                        if "upto" in entry:
+                            entries[:] = [(at, e) for at, e in entries
+                                          if at >= entry["upto"] and e.get("by") != entry.get("by")]
+                        else:
+                            entries.clear()  # Written before checkpoints carried positions
+                    else:
+                        pending.setdefault(entry.get("user_id"), []).append((start, entry))
+        except FileNotFoundError:
+            pass
+        return {uid: [e for _, e in entries] for uid, entries in pending.items() if entries}, position
+
+    @staticmethod
+    def logged_user_ids() -> set:
+        """The ids of users with entries after their last checkpoint."""
+        if not os.path.exists(OperationLog.path()):
+            return set()
+        with OperationLog._locked():
+            return set(OperationLog._read_pending()[0])
+
+    @staticmethod
+    def replay(users):
+        """Applies pending log entries to freshly loaded users (in place)."""
+        users = list(users)
+        if not users or not os.path.exists(OperationLog.path()):
+            return
+        with OperationLog._locked():
+            pending, end = OperationLog._read_pending()
+        for user in users:
+            for entry in pending.get(user.user_id, []):
+                apply_operation(user, entry["op"], entry.get("args", {}))
+            user.log_position = end
+
+    @staticmethod
+    def compact():
+        """Folds every pending entry into the snapshot and empties the log."""
+        from storage import StorageManager  # storage imports this module
+
+        with OperationLog._locked():
+            pending, _ = OperationLog._read_pending()
+            if pending:
+                # load_users replays the log, save_users writes the snapshot
+                users = StorageManager.load_users(pending.keys())
+                if not StorageManager.save_users(users.values(), quiet=True):
+                    return False
+            base, _, size = OperationLog._extent()
+            # Replaced rather than truncated, so a crash never leaves a log without its base line
+            path = OperationLog.path()
+            temp_path = path + ".tmp"
+            with open(temp_path, 'w', encoding="utf-8") as f:
+                f.write(json.dumps({"op": "base", "position": base + size}, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            OperationLog._close()
+            return True
+
+    @staticmethod
+    def compact_in_background():
+        """Starts compact() on a daemon thread unless one is already running."""
+        with OperationLog._lock:
+            if OperationLog._compacting:
+                return
+            OperationLog._compacting = True
+
+        def run():
+            try:
+                OperationLog.compact()
+            finally:
+                OperationLog._compacting = False
+
+        threading.Thread(target=run, name="oplog-compactor", daemon=True).start()
+
+
+def apply_operation(user, op: str, args: dict):
+    """Applies one logged mutation to a user without printing or logging it again."""
+    if op == "add_subject":
+        user.add_subject(Subject(args["name"], args["weight"], args.get("target_hours", 0.0)))
+    elif op == "remove_subject":
+        user.remove_subject(args["name"])
+    elif op == "set_slots":
+        if user.time_slots:
+            user.set_time_slots([], args["slots"])
+        else:
+            user.study_slots = list(args["slots"])
+    elif op == "set_time_slots":
+        user.set_time_slots(args["time_slots"], args["hours"])
+    elif op == "set_override":
+        user.set_slot_override(args["date"], args["hours"])
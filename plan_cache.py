@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from models import User, Task, StudyPlan
+from config import DATA_FILE, APP_VERSION, PLAN_CACHE_SIZE, PLAN_CACHE_DISK
+
+
+class PlanCache:
+    """
+    Bounded LRU cache of built schedules (plan, daily_plan, allocated_hours_map),
+    keyed by user id and checked against a fingerprint of everything the
+    schedule depends on. With PLAN_CACHE_DISK, schedules are also written to
+    DATA_FILE + ".plans/<fingerprint>.json" so they survive restarts.
+
+    Cached schedules are shared, so callers must treat them as read-only.
+    """
+    max_entries = PLAN_CACHE_SIZE
+    disk_enabled = PLAN_CACHE_DISK
+
+    _entries = OrderedDict()  # user_id -> (fingerprint, schedule)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(user: User, planner_version: str = "") -> str:
+        """Stable hash of the subjects, weights, targets, study and time slots and planner version."""
+        import hashlib  # Loads OpenSSL, so it waits until the first plan is built
+
+        content = json.dumps([
+            APP_VERSION,
+            planner_version,
+            [[s.name, s.weight, s.target_hours] for s in user.subjects],
+            user.study_slots,
+            user.time_slots,
+        ], separators=(",", ":"))
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _disk_path(fingerprint: str) -> str:
+        return os.path.join(DATA_FILE + ".plans", fingerprint + ".json")
+
+    @staticmethod
+    def get(user: User, fingerprint: str):
+        """Returns the cached schedule for an unchanged user, or None."""
+        with PlanCache._lock:
+            entry = PlanCache._entries.get(user.user_id)
+            if entry is not None and entry[0] == fingerprint:
+                PlanCache._entries.move_to_end(user.user_id)
+                return entry[1]
+
+        if PlanCache.disk_enabled:
+            schedule = _read_schedule(PlanCache._disk_path(fingerprint))
+            if schedule is not None:
+                PlanCache._remember(user.user_id, fingerprint, schedule)
+                return schedule
+        return None
+
+    @staticmethod
+    def put(user: User, fingerprint: str, schedule: tuple):
+        PlanCache._remember(user.user_id, fingerprint, schedule)
+        if PlanCache.disk_enabled:
+            try:
+                _write_schedule(PlanCache._disk_path(fingerprint), schedule)
+            except OSError as e:
+                print(f"Warning: could not write plan cache: {e}")
+
+    @staticmethod
+    def _remember(user_id: str, fingerprint: str, schedule: tuple):
+        with PlanCache._lock:
+            PlanCache._entries[user_id] = (fingerprint, schedule)
+            PlanCache._entries.move_to_end(user_id)
+            while len(PlanCache._entries) > PlanCache.max_entries:
+                PlanCache._entries.popitem(last=False)
+
+    @staticmethod
+    def invalidate(user_id: str):
+        """Drops a user's cached schedule (memory and disk)."""
+        with PlanCache._lock:
+            entry = PlanCache._entries.pop(user_id, None)
+        if entry is not None and PlanCache.disk_enabled:
+            try:
+                os.remove(PlanCache._disk_path(entry[0]))
+            except OSError:
+                pass
+
+    @staticmethod
+    def clear():
+        with PlanCache._lock:
+            PlanCache._entries.clear()
+
+
+def _write_schedule(path: str, schedule: tuple):
+    plan, daily_plan, allocated_hours_map = schedule
+    data = {
+        "runs": plan.runs,
+        "notes": plan.notes,
+        "days": {day: [_task_fields(t) for t in tasks] for day, tasks in daily_plan.items()},
+        "allocated": allocated_hours_map,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_file = path + ".tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(temp_file, path)
+
+
+def _task_fields(task) -> list:
+    fields = [task.subject_name, task.topic, task.hours_allocated]
+    start = getattr(task, "start", None)  # TimedTask
+    return fields if start is None else fields + [start, task.end]
+
+
+def _read_task(fields: list) -> Task:
+    if len(fields) == 5:
+        from timeslots import TimedTask  # timeslots imports planner, which imports this module
+        subject_name, topic, _, start, end = fields
+        return TimedTask(subject_name, topic, start, end)
+    return Task(*fields)
+
+
+def _read_schedule(path: str):
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        plan = StudyPlan()
+        for subject_name, topic, hours, count in data["runs"]:
+            plan.add_run(subject_name, topic, hours, count)
+        plan.notes = data["notes"]
+        daily_plan = {day: [_read_task(task) for task in tasks] for day, tasks in data["days"].items()}
+        return plan, daily_plan, data["allocated"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
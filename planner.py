@@ -1,6 +1,14 @@
 
 
-from models import User, Task, Subject
+import heapq
+from datetime import date
+from models import User, Task, Subject, StudyPlan, SubjectTable
+from oplog import OperationLog
+from plan_cache import PlanCache
+from metrics import Metrics, timed
+from config import ALLOCATION_STRATEGY, MAX_DAILY_STUDY_HOURS
+
+WEEK_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
 class StudyPlanner:
     """
@@ -10,59 +18,138 @@ class StudyPlanner:
     
 
     MAX_CONSECUTIVE_HOURS = 2.0 
+    ALGORITHM_VERSION = 4  # Bump when plans change for the same input (invalidates cached plans)
+    PARALLEL_MIN_USERS = 64  # Smaller batches are faster without a process pool
+    PARALLEL_CHUNK_SIZE = 256  # Users sent to a worker process at a time
+    ALLOCATION_STRATEGY = ALLOCATION_STRATEGY
+
     @staticmethod
-    def generate_plan(user: User) -> list[Task]:
+    @timed("planner.generate_plan")
+    def generate_plan(user: User) -> StudyPlan:
         """
         Generates a study plan by allocating available time slots to subjects 
         based on their weight (difficulty/importance).
         """
-        if not user.subjects or not user.study_slots:
-            return [] 
+        weighted_allocations = StudyPlanner.allocate_hours(user)
+        if not weighted_allocations:
+            return StudyPlan()
+        return StudyPlanner.plan_from_allocations([s.name for s in user.subjects], weighted_allocations)
+
+    @staticmethod
+    def generate_plan_for_table(table: SubjectTable, study_slots: list[float]) -> StudyPlan:
+        """Same as generate_plan, but reads subjects straight from a columnar SubjectTable."""
+        if StudyPlanner.ALLOCATION_STRATEGY == "target":
+            weighted_allocations = StudyPlanner.fill_targets(table.names, table.weights, table.target_hours,
+                                                             study_slots)
+        else:
+            weighted_allocations = StudyPlanner.split_hours(table.names, table.weights, study_slots)
+        if not weighted_allocations:
+            return StudyPlan()
+        return StudyPlanner.plan_from_allocations(table.names, weighted_allocations)
+
+    @staticmethod
+    def allocate_hours(user: User) -> dict[str, float]:
+        """
+        Splits the week's available hours between subjects, in proportion to
+        weight or target-first depending on ALLOCATION_STRATEGY.
+        Returns {subject name: hours}, or {} if there is nothing to plan.
+        """
+        names = [s.name for s in user.subjects]
+        weights = [s.weight for s in user.subjects]
+        if StudyPlanner.ALLOCATION_STRATEGY == "target":
+            return StudyPlanner.fill_targets(names, weights, [s.target_hours for s in user.subjects],
+                                             user.study_slots)
+        return StudyPlanner.split_hours(names, weights, user.study_slots)
 
-        total_available_hours = sum(user.study_slots)
+    @staticmethod
+    def split_hours(names: list[str], weights, study_slots: list[float]) -> dict[str, float]:
+        """allocate_hours over parallel name/weight sequences."""
+        if not names or not study_slots:
+            return {}
+
+        total_available_hours = sum(study_slots)
         if total_available_hours == 0:
-            return []
+            return {}
 
        
-        total_weight = sum(s.weight for s in user.subjects)
+        total_weight = sum(weights)
         if total_weight == 0:
            
-            equal_weight = 1
-            total_weight = len(user.subjects) * equal_weight
-            weighted_allocations = {s.name: total_available_hours / len(user.subjects) for s in user.subjects}
+            equal_share = total_available_hours / len(names)
+            weighted_allocations = {name: equal_share for name in names}
         else:
             
             weighted_allocations = {}
-            for subject in user.subjects:
+            for name, weight in zip(names, weights):
                 
-                proportion = subject.weight / total_weight
+                proportion = weight / total_weight
                 hours_to_allocate = total_available_hours * proportion
-                weighted_allocations[subject.name] = hours_to_allocate
+                weighted_allocations[name] = hours_to_allocate
+        return weighted_allocations
 
-        plan: list[Task] = []
+    @staticmethod
+    def fill_targets(names: list[str], weights, targets, study_slots: list[float]) -> dict[str, float]:
+        """
+        Allocation with the smallest weighted deficit, sum(weight * max(0, target - hours)),
+        within what DayScheduler can place: each day counts at most
+        MAX_DAILY_STUDY_HOURS, and since no subject is studied for more than
+        MAX_CONSECUTIVE_HOURS at a time, one subject gets at most the cap per
+        day on its own, or about (day + cap) / 2 when it alternates with others.
 
-      
-        for subject in user.subjects:
-            allocated = weighted_allocations.get(subject.name, 0)
-            if allocated >= 1.0:
-               
-                num_tasks = int(allocated)
-                remainder = allocated - num_tasks
-                
-               
-                for i in range(num_tasks):
-                    task_desc = "High-priority concept review" if i == 0 else "Practice problems and exercises"
-                    plan.append(Task(subject.name, task_desc, 1.0))
-                
-                
-                if remainder > 0.01: 
-                     plan.append(Task(subject.name, "Quick review/Problem set", remainder))
-            elif allocated > 0.01:
-                
-                plan.append(Task(subject.name, "Quick review/Problem set", allocated))
+        Every hour given to a subject below its target lowers the deficit by
+        that subject's weight, so targets are filled in descending weight
+        order up to that per-subject limit (a fractional knapsack). Hours left
+        once every target is met are split by weight (water-filling up to the
+        limit); hours no subject can take are left out. O(S log S).
+        """
+        if not names or not study_slots:
+            return {}
+        day_hours = [min(hours, MAX_DAILY_STUDY_HOURS) for hours in study_slots if hours > 0]
+        capacity = sum(day_hours)
+        if capacity <= 0:
+            return {}
+
+        cap = StudyPlanner.MAX_CONSECUTIVE_HOURS
+        if len(names) > 1:
+            limit = sum(min(hours, max(cap, (hours + cap) / 2)) for hours in day_hours)
+        else:
+            limit = sum(min(hours, cap) for hours in day_hours)
+
+        allocations = dict.fromkeys(names, 0.0)
+        left = capacity
+        for i in sorted(range(len(names)), key=lambda i: -weights[i]):  # Stable: ties keep subject order
+            if left <= 0:
+                break
+            hours = min(targets[i], left, limit)
+            allocations[names[i]] = hours
+            left -= hours
+
+        # Split the rest by weight; subjects with the least room per unit of weight fill up first
+        open_subjects = [i for i in range(len(names)) if allocations[names[i]] < limit]
+        if not any(weights[i] for i in open_subjects):
+            shares = {i: 1 for i in open_subjects}  # All weights zero: split equally, like split_hours
+        else:
+            shares = {i: weights[i] for i in open_subjects if weights[i] > 0}
+        total_share = sum(shares.values())
+        for i in sorted(shares, key=lambda i: (limit - allocations[names[i]]) / shares[i]):
+            if left <= 0:
+                break
+            room = limit - allocations[names[i]]
+            hours = min(room, left * shares[i] / total_share)
+            allocations[names[i]] += hours
+            left -= hours
+            total_share -= shares[i]
+        return allocations
 
+    @staticmethod
+    def plan_from_allocations(subject_names: list[str], weighted_allocations: dict[str, float]) -> StudyPlan:
+        """Turns per-subject hours into study tasks (1-hour sessions plus a remainder)."""
+        plan = StudyPlan()
+        for name in subject_names:
+            for run in StudyPlanner.subject_runs(name, weighted_allocations.get(name, 0)):
+                plan.add_run(*run)
 
-        plan.sort(key=lambda t: t.subject_name)
+        plan.sort_by_subject()
         
         
         StudyPlanner._add_recommendations(plan)
@@ -70,27 +157,381 @@ class StudyPlanner:
         return plan
 
     @staticmethod
-    def _add_recommendations(plan: list[Task]):
-        """A simple, hardcoded recommendation based on the subject."""
-       
-        recommendations = {
-            "Algorithms": "Suggested Resource: Watch a video on Dynamic Programming on YouTube.",
-            "Data Structures": "Suggested Resource: Read an article on Hash Table collision resolution techniques.",
-            "C Programming": "Suggested Resource: Practice pointer arithmetic problems online.",
-            "Calculus": "Suggested Resource: Review related theorems and proof methods.",
-            "Physics": "Suggested Resource: Practice derivations and problem-solving techniques.",
-            "Mathematics": "Suggested Resource: Work through practice problems from your textbook.",
-            "Chemistry": "Suggested Resource: Review reaction mechanisms and balancing equations.",
-            "Default": "Suggested Resource: Find a recent tech blog post related to your field."
+    def subject_runs(subject_name: str, allocated: float) -> list[tuple[str, str, float, int]]:
+        """The (subject, topic, hours, count) runs for one subject's allocated hours."""
+        runs = []
+        if allocated >= 1.0:
+           
+            num_tasks = int(allocated)
+            remainder = allocated - num_tasks
+            
+           
+            runs.append((subject_name, "High-priority concept review", 1.0, 1))
+            if num_tasks > 1:
+                runs.append((subject_name, "Practice problems and exercises", 1.0, num_tasks - 1))
+            
+            
+            if remainder > 0.01: 
+                 runs.append((subject_name, "Quick review/Problem set", remainder, 1))
+        elif allocated > 0.01:
+            
+            runs.append((subject_name, "Quick review/Problem set", allocated, 1))
+        return runs
+
+    @staticmethod
+    def build_schedule(user: User) -> tuple[StudyPlan, dict, dict]:
+        """
+        Generates the plan and lays it out over the week, returning
+        (plan, daily_plan, allocated_hours_map). Results are served from
+        PlanCache while the user's subjects and slots are unchanged.
+        """
+        version = (f"{StudyPlanner.ALGORITHM_VERSION}:{StudyPlanner.MAX_CONSECUTIVE_HOURS}:"
+                   f"{StudyPlanner.ALLOCATION_STRATEGY}:{_catalog().version}")
+        fingerprint = PlanCache.fingerprint(user, version)
+        schedule = PlanCache.get(user, fingerprint)
+        Metrics.increment("plan_cache.hit" if schedule is not None else "plan_cache.miss")
+        if schedule is None:
+            plan = StudyPlanner.generate_plan(user)
+            daily_plan, allocated_hours_map = StudyPlanner.lay_out(user, plan)
+            schedule = (plan, daily_plan, allocated_hours_map)
+            PlanCache.put(user, fingerprint, schedule)
+        return schedule
+
+    @staticmethod
+    def lay_out(user: User, plan: StudyPlan) -> tuple[dict, dict]:
+        """
+        (daily_plan, allocated_hours_map) for the user's week. Users with
+        time_slots get sessions at concrete times from TimeSlotScheduler.
+        """
+        if user.time_slots:
+            from timeslots import TimeSlotScheduler, intervals_for  # timeslots imports this module
+            return TimeSlotScheduler().schedule(plan, intervals_for(user), user.subjects)
+        return DayScheduler().schedule(plan, user.study_slots, user.subjects)
+
+    @staticmethod
+    def generate_plans(users, workers: int = None):
+        """
+        Generates plans for many users, yielding (user_id, plan) pairs as they finish.
+        Users are spread over a process pool in chunks (workers defaults to the CPU
+        count); batches below PARALLEL_MIN_USERS or workers=1 run in this process.
+        Results from the pool arrive in completion order, not input order.
+        """
+        users = list(users)
+        if workers == 1 or len(users) < StudyPlanner.PARALLEL_MIN_USERS:
+            for user in users:
+                yield user.user_id, StudyPlanner.generate_plan(user)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor, as_completed  # Slow to import; rarely needed
+
+        chunk_size = StudyPlanner.PARALLEL_CHUNK_SIZE
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_generate_plan_chunk, users[i:i + chunk_size])
+                       for i in range(0, len(users), chunk_size)]
+            for future in as_completed(futures):
+                yield from future.result()
+
+    @staticmethod
+    @timed("planner.add_recommendations")
+    def _add_recommendations(plan: StudyPlan):
+        """Looks up a resource for each subject in the recommendation catalog."""
+        catalog = _catalog()
+        # Shown on the first task of each subject when the plan is expanded
+        for subject_name in plan.subject_names():
+            plan.notes[subject_name] = catalog.lookup(subject_name)
+
+class DayScheduler:
+    """
+    Lays a plan out over the days of the week.
+
+    Each sitting goes to the subject with the most hours left (a max-heap keyed
+    on remaining hours, ties broken by plan order). The subject studied last is
+    passed over once it reaches MAX_CONSECUTIVE_HOURS; if no other subject has
+    hours left the day ends early. Cost is O(T log S) for T tasks, S subjects.
+    """
+    EPSILON = 0.001
+
+    def __init__(self, max_consecutive_hours: float = StudyPlanner.MAX_CONSECUTIVE_HOURS):
+        self.max_consecutive_hours = max_consecutive_hours
+
+    @staticmethod
+    def _task_queues(plan) -> dict[str, list]:
+        """
+        Per subject, the runs still to place as [topic, task hours, tasks left,
+        hours left in the current task]. The last entry is placed next.
+        """
+        if not isinstance(plan, StudyPlan):
+            tasks, plan = plan, StudyPlan()
+            for task in tasks:
+                plan.add_run(task.subject_name, task.topic, task.hours_allocated)
+
+        queues = {}
+        for subject_name, topic, hours, count in plan.display_runs():
+            queues.setdefault(subject_name, []).append([topic, hours, count, hours])
+        for queue in queues.values():
+            queue.reverse()
+        return queues
+
+    @timed("scheduler.schedule")
+    def schedule(self, plan, study_slots: list[float], subjects: list[Subject] = None,
+                 day_names: list = WEEK_DAYS) -> tuple[dict, dict]:
+        """
+        Returns (daily_plan, allocated_hours_map): {day: [Task]} for every day
+        in day_names and {subject name: hours scheduled this week}.
+        """
+        daily_plan = {day: [] for day in day_names}
+        if subjects is not None:
+            allocated_hours_map = {s.name: 0.0 for s in subjects}
+        else:
+            allocated_hours_map = {}
+
+        queues, remaining = self._start(plan)
+        for day, available_hours in zip(day_names, study_slots):
+            self._lay_out_day(queues, remaining, available_hours, daily_plan[day], allocated_hours_map)
+        return daily_plan, allocated_hours_map
+
+    def _start(self, plan) -> tuple[dict, dict]:
+        """The (queues, remaining hours per subject) the week starts from."""
+        queues = self._task_queues(plan)
+        remaining = {name: sum(hours * count for _, hours, count, _ in queue) for name, queue in queues.items()}
+        return queues, remaining
+
+    def _lay_out_day(self, queues: dict, remaining: dict, available_hours: float, day_tasks: list,
+                     allocated_hours_map: dict):
+        """
+        Places one day's sittings, appending to day_tasks and updating queues,
+        remaining and allocated_hours_map in place. The heap is rebuilt from
+        remaining, so a week can be resumed from the state at any day start.
+        """
+        if available_hours <= 0:
+            return
+        order = {name: i for i, name in enumerate(queues)}
+        heap = [(-hours, order[name], name) for name, hours in remaining.items() if hours > self.EPSILON]
+        heapq.heapify(heap)
+
+        def pop_current():
+            # Entries are pushed again on every update, so skip outdated ones
+            while heap:
+                neg_hours, _, name = heapq.heappop(heap)
+                if -neg_hours == remaining[name] and remaining[name] > self.EPSILON:
+                    return name
+            return None
+
+        hours_used = 0.0
+        last_subject = None
+        consecutive_hours = 0.0
+
+        while available_hours - hours_used >= self.EPSILON:
+            subject_name = pop_current()
+            if subject_name is None:
+                break
+            if subject_name == last_subject and consecutive_hours >= self.max_consecutive_hours - self.EPSILON:
+                other = pop_current()
+                heapq.heappush(heap, (-remaining[subject_name], order[subject_name], subject_name))
+                if other is None:
+                    break
+                subject_name = other
+            if subject_name != last_subject:
+                consecutive_hours = 0.0
+
+            time_to_allocate = min(remaining[subject_name],
+                                   available_hours - hours_used,
+                                   self.max_consecutive_hours - consecutive_hours)
+
+            # Consume the subject's tasks in plan order, splitting the last one if needed
+            queue = queues[subject_name]
+            left = time_to_allocate
+            while left >= self.EPSILON and queue:
+                run = queue[-1]
+                topic, task_hours, tasks_left, current = run
+                portion = min(current, left)
+                day_tasks.append(Task(subject_name, topic, portion))
+                left -= portion
+                if current - portion >= self.EPSILON:
+                    run[3] = current - portion
+                elif tasks_left > 1:
+                    run[2] = tasks_left - 1
+                    run[3] = task_hours
+                else:
+                    queue.pop()
+
+            hours_used += time_to_allocate
+            consecutive_hours += time_to_allocate
+            allocated_hours_map[subject_name] = allocated_hours_map.get(subject_name, 0.0) + time_to_allocate
+            remaining[subject_name] -= time_to_allocate
+            last_subject = subject_name
+            if remaining[subject_name] > self.EPSILON:
+                heapq.heappush(heap, (-remaining[subject_name], order[subject_name], subject_name))
+
+
+class IncrementalPlanner:
+    """
+    Keeps one user's schedule up to date across edits instead of rebuilding it.
+
+    The allocation, each subject's runs and the scheduler state at the start of
+    every day are kept. After an edit only subjects whose hours moved get new
+    runs, spliced into the plan, and the week is laid out again from the first
+    day whose input changed, going back to the old days once a day ends in the
+    state it ended in before. Proportional shares depend only on the week's
+    total hours and the weights, so moving hours between days keeps the split.
+    Results match StudyPlanner.build_schedule for users without time_slots.
+    """
+
+    def __init__(self, user: User, scheduler: DayScheduler = None):
+        self.user = user
+        self.scheduler = scheduler or DayScheduler()
+        self.allocations = StudyPlanner.allocate_hours(user)
+        self._runs = {}
+        self.plan = StudyPlan()
+        for subject in user.subjects:
+            runs = StudyPlanner.subject_runs(subject.name, self.allocations.get(subject.name, 0))
+            self._runs[subject.name] = runs
+            for run in runs:
+                self.plan.add_run(*run)
+        self.plan.sort_by_subject()
+        StudyPlanner._add_recommendations(self.plan)
+        self._slots = []
+        self._states = []  # Scheduler state at the start of each laid-out day, then at the end of the week
+        self.daily_plan = {}
+        self._scheduled = {}
+        self._lay_out(0)
+
+    @property
+    def schedule(self) -> tuple[StudyPlan, dict, dict]:
+        """(plan, daily_plan, allocated_hours_map), as from StudyPlanner.build_schedule."""
+        allocated_hours_map = {s.name: self._scheduled.get(s.name, 0.0) for s in self.user.subjects}
+        return self.plan, self.daily_plan, allocated_hours_map
+
+    def add_subject(self, name: str, weight: int, target_hours: float = 0.0):
+        """SubjectManager.add_subject, then an update; returns (schedule, changes) or None."""
+        if not SubjectManager.add_subject(self.user, name, weight, target_hours):
+            return None
+        return self._update(added=[self.user.subjects[-1].name])
+
+    def remove_subject(self, name: str):
+        """SubjectManager.remove_subject, then an update; returns (schedule, changes) or None."""
+        subject = self.user.find_subject(name.strip()) if name else None
+        if not SubjectManager.remove_subject(self.user, name):
+            return None
+        return self._update(removed=[subject.name])
+
+    def set_study_slots(self, slots: list[float]):
+        """SubjectManager.set_study_slots, then an update; returns (schedule, changes) or None."""
+        if not SubjectManager.set_study_slots(self.user, slots):
+            return None
+        return self._update()
+
+    def _update(self, added=(), removed=()) -> tuple[tuple, dict]:
+        """
+        Brings the schedule in line with an edit already made to the user.
+        The change set lists the subjects added and removed, {subject: (old
+        hours, new hours)} for each allocation that moved, and the days whose
+        tasks changed.
+        """
+        user = self.user
+        if (added or removed or StudyPlanner.ALLOCATION_STRATEGY == "target" or not self.allocations
+                or not user.study_slots or sum(user.study_slots) != sum(self._slots)):
+            allocations = StudyPlanner.allocate_hours(user)
+        else:
+            allocations = self.allocations
+        hours = {}
+        for name in set(self.allocations) | set(allocations):
+            old, new = self.allocations.get(name, 0.0), allocations.get(name, 0.0)
+            if old != new:
+                hours[name] = (old, new)
+        self.allocations = allocations
+
+        plan_changed = False
+        for name in removed:
+            if self._runs.pop(name, None):
+                self.plan.replace_subject_runs(name, [])
+                self.plan.notes.pop(name, None)
+                plan_changed = True
+        for name in dict.fromkeys([*added, *hours]):
+            if name in removed:
+                continue
+            runs = StudyPlanner.subject_runs(name, allocations.get(name, 0))
+            if runs == self._runs.get(name, []):
+                continue
+            self._runs[name] = runs
+            self.plan.replace_subject_runs(name, runs)
+            if not runs:
+                self.plan.notes.pop(name, None)
+            elif name not in self.plan.notes:
+                self.plan.notes[name] = _catalog().lookup(name)
+            plan_changed = True
+
+        old_days = self.daily_plan
+        self._lay_out(0 if plan_changed else self._first_changed_slot())
+        changes = {
+            "added": list(added),
+            "removed": list(removed),
+            "hours": hours,
+            "days": [day for day in WEEK_DAYS if self._task_keys(self.daily_plan[day]) != self._task_keys(old_days[day])],
         }
-        
-       
-        seen_subjects = set()
-        for task in plan:
-            if task.subject_name not in seen_subjects:
-                recommendation = recommendations.get(task.subject_name, recommendations["Default"])
-                task.topic = f"{task.topic} ({recommendation})"
-                seen_subjects.add(task.subject_name)
+        return self.schedule, changes
+
+    def _first_changed_slot(self) -> int:
+        """Index of the first day whose available hours differ from the last layout."""
+        old, new = self._slots, self.user.study_slots
+        for i in range(min(len(old), len(new))):
+            if old[i] != new[i]:
+                return i
+        return min(len(old), len(new))
+
+    def _lay_out(self, first_day: int):
+        """Lays the week out again from first_day, reusing the old days once the state matches."""
+        scheduler = self.scheduler
+        slots = list(self.user.study_slots)
+        old_slots, old_states, old_days = self._slots, self._states, self.daily_plan
+        days = min(len(WEEK_DAYS), len(slots))
+        first_day = min(first_day, days, max(len(old_states) - 1, 0))
+        if first_day == 0:
+            queues, remaining = scheduler._start(self.plan)
+            scheduled = {}
+        else:
+            queues, remaining, scheduled = self._copy_state(old_states[first_day])
+
+        states = old_states[:first_day]
+        daily_plan = {day: old_days[day] for day in WEEK_DAYS[:first_day]}
+        for day in range(first_day, days + 1):
+            state = (queues, remaining, scheduled)
+            if (day > first_day and day < len(old_states) and state == old_states[day]
+                    and slots[day:len(WEEK_DAYS)] == old_slots[day:len(WEEK_DAYS)]):
+                # Same state and the same days ahead, so the rest of the old week still holds
+                states.extend(old_states[day:])
+                daily_plan.update((name, old_days[name]) for name in WEEK_DAYS[day:days])
+                scheduled = self._scheduled
+                break
+            states.append(self._copy_state(state))
+            if day < days:
+                daily_plan[WEEK_DAYS[day]] = tasks = []
+                scheduler._lay_out_day(queues, remaining, slots[day], tasks, scheduled)
+
+        self._slots, self._states, self._scheduled = slots, states, scheduled
+        self.daily_plan = {day: daily_plan.get(day, []) for day in WEEK_DAYS}
+
+    @staticmethod
+    def _task_keys(tasks: list) -> list[tuple]:
+        return [(task.subject_name, task.topic, task.hours_allocated) for task in tasks]
+
+    @staticmethod
+    def _copy_state(state) -> tuple[dict, dict, dict]:
+        queues, remaining, scheduled = state
+        return ({name: [list(run) for run in queue] for name, queue in queues.items()},
+                dict(remaining), dict(scheduled))
+
+
+def _catalog():
+    # Imported on first use: building the catalog's index is not needed to show the CLI menu
+    from recommendations import get_catalog
+    return get_catalog()
+
+
+def _generate_plan_chunk(users: list[User]) -> list[tuple[str, StudyPlan]]:
+    """Process-pool worker for StudyPlanner.generate_plans."""
+    return [(user.user_id, StudyPlanner.generate_plan(user)) for user in users]
+
 
 class SubjectManager:
     """
@@ -115,12 +556,13 @@ class SubjectManager:
             return False
 
       
-        if any(s.name.lower() == name.lower() for s in user.subjects):
+        new_subject = Subject(name, weight, target_hours)
+        if not user.add_subject(new_subject):
             print(f"Subject '{name}' already exists.")
             return False
 
-        new_subject = Subject(name, weight, target_hours)
-        user.subjects.append(new_subject)
+        PlanCache.invalidate(user.user_id)
+        OperationLog.append(user.user_id, "add_subject", name=name, weight=weight, target_hours=target_hours)
         print(f"Subject '{name}' added successfully (Weight: {weight}, Target: {target_hours:.1f} hrs).")
         return True
 
@@ -132,15 +574,67 @@ class SubjectManager:
             return False
             
         name = name.strip()
-        initial_count = len(user.subjects)
-        user.subjects = [s for s in user.subjects if s.name.lower() != name.lower()]
-        if len(user.subjects) < initial_count:
+        if user.remove_subject(name) is not None:
+            PlanCache.invalidate(user.user_id)
+            OperationLog.append(user.user_id, "remove_subject", name=name)
             print(f"Subject '{name}' removed successfully.")
             return True
         else:
             print(f"Subject '{name}' not found.")
             return False
             
+    @staticmethod
+    def set_study_slots(user: User, slots: list[float]):
+        """Replaces the weekly study slots (available hours per day)."""
+        if any(not (0 <= hours <= 24) for hours in slots):
+            print("Hours must be between 0 and 24.")
+            return False
+
+        if user.time_slots:
+            user.set_time_slots([], slots)  # Plain hours replace any time intervals
+        else:
+            user.study_slots = list(slots)
+        PlanCache.invalidate(user.user_id)
+        OperationLog.append(user.user_id, "set_slots", slots=user.study_slots)
+        return True
+
+    @staticmethod
+    def set_time_slots(user: User, time_slots: list[list[str]]):
+        """
+        Replaces the weekly availability with time intervals per day, e.g.
+        [["09:00-11:30", "14:00-15:00"], [], ...]; study_slots becomes their hours.
+        """
+        from timeslots import parse_interval, merge_intervals, format_interval  # timeslots imports this module
+
+        try:
+            days = [merge_intervals(parse_interval(text) for text in day) for day in time_slots]
+        except (TypeError, ValueError, AttributeError) as e:
+            print(f"Invalid time slot: {e}")
+            return False
+
+        normalized = [[format_interval(start, end) for start, end in day] for day in days]
+        hours = [sum(end - start for start, end in day) / 60 for day in days]
+        user.set_time_slots(normalized, hours)
+        PlanCache.invalidate(user.user_id)
+        OperationLog.append(user.user_id, "set_time_slots", time_slots=normalized, hours=hours)
+        return True
+
+    @staticmethod
+    def set_slot_override(user: User, day: str, hours: float | None):
+        """Sets (or with hours=None, clears) the study hours for one date, "YYYY-MM-DD"."""
+        try:
+            day = date.fromisoformat(day).isoformat()
+        except (TypeError, ValueError):
+            print("Dates must look like YYYY-MM-DD.")
+            return False
+        if hours is not None and not (0 <= hours <= 24):
+            print("Hours must be between 0 and 24.")
+            return False
+
+        user.set_slot_override(day, hours)
+        OperationLog.append(user.user_id, "set_override", date=day, hours=hours)
+        return True
+
     @staticmethod
     def view_subjects(user: User):
         """Displays all subjects."""
@@ -0,0 +1,236 @@
+"""
+Recommendation catalog: resources tagged by subject, keywords and difficulty,
+indexed once so a subject name like "Intro to Algorithms II" finds the
+resources for "Algorithms".
+
+Names are normalized into tokens (lowercase singular words without filler
+such as "intro", "to" or course numbers). An inverted index maps each token
+to the subject/keyword phrases it appears in, and a prefix trie over the same
+tokens lets "Calc" find "calculus" and "Algorithmic" find "algorithm". A resource
+matches when every token of its subject or of one of its keywords is present;
+the best match wins, ties go to the closest difficulty, then catalog order.
+Results are cached per (subject, difficulty).
+
+The built-in catalog holds the original recommendations; RECOMMENDATIONS_FILE
+can point to a JSON file of the form
+    {"default": "...", "resources": [{"subject": "Algorithms", "text": "...",
+                                      "keywords": ["dynamic programming"], "difficulty": 3}]}
+"""
+import hashlib
+import json
+import re
+import threading
+from config import RECOMMENDATIONS_FILE
+
+DEFAULT_TEXT = "Suggested Resource: Find a recent tech blog post related to your field."
+
+BUILTIN_RESOURCES = [
+    {"subject": "Algorithms", "text": "Suggested Resource: Watch a video on Dynamic Programming on YouTube.",
+     "keywords": ["dynamic programming", "graph theory"]},
+    {"subject": "Data Structures",
+     "text": "Suggested Resource: Read an article on Hash Table collision resolution techniques.",
+     "keywords": ["hash tables", "linked lists"]},
+    {"subject": "C Programming", "text": "Suggested Resource: Practice pointer arithmetic problems online.",
+     "keywords": ["pointers"]},
+    {"subject": "Calculus", "text": "Suggested Resource: Review related theorems and proof methods.",
+     "keywords": ["integrals", "derivatives"]},
+    {"subject": "Physics", "text": "Suggested Resource: Practice derivations and problem-solving techniques.",
+     "keywords": ["mechanics", "thermodynamics"]},
+    {"subject": "Mathematics", "text": "Suggested Resource: Work through practice problems from your textbook.",
+     "keywords": ["algebra", "maths"]},
+    {"subject": "Chemistry", "text": "Suggested Resource: Review reaction mechanisms and balancing equations.",
+     "keywords": ["organic chemistry"]},
+]
+
+# Words that say nothing about the topic itself
+STOPWORDS = frozenset("""
+a an and the of to in for on with intro introduction introductory advanced basic basics
+fundamentals foundations principles topics course i ii iii iv v part
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+MIN_PREFIX = 3  # Shortest query token that may match as a prefix
+CACHE_SIZE = 4096
+
+
+def _stem(token: str) -> str:
+    """Drops a plural "s" so "algorithms" and "algorithmic" share the prefix "algorithm"."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, singular topic words, without stopwords and plain course numbers."""
+    return [_stem(t) for t in _TOKEN_RE.findall(text.casefold()) if t not in STOPWORDS and not t.isdigit()]
+
+
+class Resource:
+    __slots__ = ("subject", "text", "keywords", "difficulty")
+
+    def __init__(self, subject: str, text: str, keywords: list[str] = (), difficulty: int = None):
+        self.subject = subject
+        self.text = text
+        self.keywords = tuple(keywords)
+        self.difficulty = difficulty
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["subject"], data["text"], data.get("keywords", ()), data.get("difficulty"))
+
+
+class _TrieNode:
+    __slots__ = ("children", "token")
+
+    def __init__(self):
+        self.children = {}
+        self.token = None  # Set when an indexed token ends here
+
+
+class RecommendationCatalog:
+    """Inverted index plus prefix trie over the resources' subject and keyword tokens."""
+
+    def __init__(self, resources: list[Resource], default_text: str = DEFAULT_TEXT):
+        self.resources = list(resources)
+        self.default_text = default_text
+        self._exact = {}      # casefolded subject -> first resource id
+        self._phrases = []    # phrase id -> (resource id, token count, score)
+        self._postings = {}   # token -> [phrase ids]
+        self._trie = _TrieNode()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+        for rid, resource in enumerate(self.resources):
+            self._exact.setdefault(resource.subject.casefold(), rid)
+            self._add_phrase(rid, resource.subject, weight=2)
+            for keyword in resource.keywords:
+                self._add_phrase(rid, keyword, weight=1)
+
+        fingerprint = json.dumps([default_text] + [[r.subject, r.text, r.keywords, r.difficulty]
+                                                   for r in self.resources])
+        self.version = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12]
+
+    def _add_phrase(self, rid: int, text: str, weight: int):
+        tokens = set(tokenize(text))
+        if not tokens:
+            return
+        phrase_id = len(self._phrases)
+        self._phrases.append((rid, len(tokens), weight * len(tokens)))
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = []
+                self._insert(token)
+            postings.append(phrase_id)
+
+    def _insert(self, token: str):
+        node = self._trie
+        for char in token:
+            node = node.children.setdefault(char, _TrieNode())
+        node.token = token
+
+    def _expand(self, query_token: str) -> list[str]:
+        """Indexed tokens a query token stands for: itself, its completions, or its longest prefix."""
+        if query_token in self._postings:
+            return [query_token]
+        node = self._trie
+        longest_prefix = None
+        for char in query_token:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.token is not None and len(node.token) >= MIN_PREFIX + 1:
+                longest_prefix = node.token
+        else:
+            if len(query_token) >= MIN_PREFIX:
+                completions = []
+                stack = [node]
+                while stack:
+                    current = stack.pop()
+                    if current.token is not None:
+                        completions.append(current.token)
+                    stack.extend(current.children.values())
+                return completions
+        return [longest_prefix] if longest_prefix else []
+
+    def _search(self, subject_name: str, difficulty: int = None):
+        if difficulty is None:
+            rid = self._exact.get(subject_name.strip().casefold())
+            if rid is not None:
+                return self.resources[rid]
+
+        matched = {}  # phrase id -> number of its tokens found
+        for query_token in set(tokenize(subject_name)):
+            seen = set()
+            for token in self._expand(query_token):
+                for phrase_id in self._postings[token]:
+                    if phrase_id not in seen:
+                        seen.add(phrase_id)
+                        matched[phrase_id] = matched.get(phrase_id, 0) + 1
+
+        scores = {}
+        for phrase_id, count in matched.items():
+            rid, size, score = self._phrases[phrase_id]
+            if count >= size:  # Every token of the phrase is in the name
+                scores[rid] = scores.get(rid, 0) + score
+        if not scores:
+            return None
+
+        def rank(rid):
+            resource_difficulty = self.resources[rid].difficulty
+            distance = 0 if difficulty is None or resource_difficulty is None else abs(resource_difficulty - difficulty)
+            return -scores[rid], distance, rid
+
+        return self.resources[min(scores, key=rank)]
+
+    def lookup(self, subject_name: str, difficulty: int = None) -> str:
+        """The recommendation text for a subject (the default text if nothing matches)."""
+        key = (subject_name, difficulty)
+        text = self._cache.get(key)
+        if text is None:
+            resource = self._search(subject_name, difficulty)
+            text = resource.text if resource is not None else self.default_text
+            with self._lock:
+                if len(self._cache) >= CACHE_SIZE:
+                    self._cache.clear()
+                self._cache[key] = text
+        return text
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path, 'r', encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            data = {"resources": data}
+        return cls([Resource.from_dict(r) for r in data["resources"]], data.get("default", DEFAULT_TEXT))
+
+    @classmethod
+    def builtin(cls):
+        return cls([Resource.from_dict(r) for r in BUILTIN_RESOURCES])
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> RecommendationCatalog:
+    """The process-wide catalog, built on first use from RECOMMENDATIONS_FILE or the built-ins."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                if RECOMMENDATIONS_FILE:
+                    try:
+                        _catalog = RecommendationCatalog.from_file(RECOMMENDATIONS_FILE)
+                    except (OSError, ValueError, KeyError, TypeError) as e:
+                        print(f"Warning: could not load recommendations from {RECOMMENDATIONS_FILE}: {e}")
+                if _catalog is None:
+                    _catalog = RecommendationCatalog.builtin()
+    return _catalog
+
+
+def set_catalog(catalog: RecommendationCatalog):
+    """Replaces the process-wide catalog (e.g. after editing the file)."""
+    global _catalog
+    with _catalog_lock:
+        _catalog = catalog
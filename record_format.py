@@ -0,0 +1,437 @@
+"""
+Compact on-disk format for user stores (STORAGE_BACKEND = "records").
+
+Instead of pretty-printed JSON, RECORDS_FILE holds a stream of
+length-prefixed records packed into chunks of about RECORDS_CHUNK_BYTES.
+Each chunk is compressed on its own, so loading one user only inflates the
+chunk that holds it, and saving only recompresses the chunks that changed;
+the others are copied byte for byte.
+
+Layout (integers are big-endian):
+    MAGIC
+    chunk ...   stored bytes of each chunk (compressed with its codec)
+    footer      compact JSON {"chunks": [[offset, size, codec, raw_size, crc32], ...],
+                              "users": {user_id: [chunk, start, end], ...}}
+    trailer     footer offset (8 bytes), footer size (4 bytes), MAGIC
+
+An uncompressed chunk is a run of records: user id length (2 bytes), user
+id, JSON length (4 bytes), the user's compact JSON. start/end in the footer
+locate the JSON inside the uncompressed chunk. Codecs: 0 none, 1 zlib,
+2 lzma; files mixing codecs read fine, and new chunks use
+RECORDS_COMPRESSION.
+
+Converting from and to the JSON layout:
+    python record_format.py to-records [JSON_FILE] [RECORD_FILE] [--compression lzma]
+    python record_format.py to-json [RECORD_FILE] [JSON_FILE]
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import zlib
+from models import User
+from metrics import Metrics
+from storage import file_lock
+from config import DATA_FILE, RECORDS_FILE, RECORDS_COMPRESSION, RECORDS_CHUNK_BYTES
+
+MAGIC = b"SPREC\x01"
+CODECS = {"none": 0, "zlib": 1, "lzma": 2}
+
+_ID_LENGTH = struct.Struct(">H")
+_JSON_LENGTH = struct.Struct(">I")
+_TRAILER = struct.Struct(">QI")
+
+# Parsed footers by absolute path, tagged with the (size, mtime, inode) they
+# were read from; files are only ever replaced whole, so a match is current.
+_footers = {}
+
+
+def _compress(codec: int, payload: bytes) -> bytes:
+    with Metrics.span("records.compress"):
+        if codec == 1:
+            return zlib.compress(payload, 6)
+        if codec == 2:
+            import lzma  # Only loaded when a file uses it
+            return lzma.compress(payload)
+        return payload
+
+
+def _decompress(codec: int, stored: bytes) -> bytes:
+    """Raises ValueError for damaged data, whichever codec reports it."""
+    with Metrics.span("records.decompress"):
+        if codec == 1:
+            try:
+                return zlib.decompress(stored)
+            except zlib.error as e:
+                raise ValueError(f"damaged zlib chunk: {e}") from None
+        if codec == 2:
+            import lzma
+            try:
+                return lzma.decompress(stored)
+            except lzma.LZMAError as e:
+                raise ValueError(f"damaged lzma chunk: {e}") from None
+        if codec == 0:
+            return stored
+        raise ValueError(f"unknown chunk codec {codec}")
+
+
+def _encode(user_dict: dict) -> bytes:
+    with Metrics.span("storage.json_encode"):
+        return json.dumps(user_dict, separators=(",", ":")).encode("utf-8")
+
+
+class RecordReader:
+    """Reads one record file: the footer on open, chunks only when asked for."""
+
+    def __init__(self, f):
+        self._f = f
+        stat = os.fstat(f.fileno())
+        key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        path = os.path.abspath(f.name)
+        cached = _footers.get(path)
+        if cached is not None and cached[0] == key:
+            _, self.chunks, self.users = cached
+        else:
+            self.chunks, self.users = self._read_footer(stat.st_size)
+            _footers[path] = (key, self.chunks, self.users)
+        self._inflated = (None, b"")  # Last chunk decompressed, so neighbours share it
+        self._by_chunk = None
+
+    def _read_footer(self, size: int):
+        f = self._f
+        if size < 2 * len(MAGIC) + _TRAILER.size or f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("not a record file")
+        f.seek(size - _TRAILER.size - len(MAGIC))
+        tail = f.read()
+        if tail[_TRAILER.size:] != MAGIC:
+            raise ValueError("record file is truncated")
+        footer_offset, footer_size = _TRAILER.unpack(tail[:_TRAILER.size])
+        f.seek(footer_offset)
+        footer = json.loads(f.read(footer_size))
+        return footer["chunks"], footer["users"]
+
+    def chunk_users(self, index: int) -> list[str]:
+        """The ids stored in chunk `index` (grouped for all chunks on first call)."""
+        if self._by_chunk is None:
+            self._by_chunk = [[] for _ in self.chunks]
+            for user_id, (chunk, _, _) in self.users.items():
+                self._by_chunk[chunk].append(user_id)
+        return self._by_chunk[index]
+
+    def stored(self, index: int) -> bytes:
+        offset, size = self.chunks[index][:2]
+        self._f.seek(offset)
+        stored = self._f.read(size)
+        if len(stored) != size:
+            raise ValueError(f"chunk {index} is truncated")
+        return stored
+
+    def payload(self, index: int) -> bytes:
+        """The uncompressed records of chunk `index`, checked against its crc32."""
+        if self._inflated[0] != index:
+            _, _, codec, raw_size, crc = self.chunks[index]
+            payload = _decompress(codec, self.stored(index))
+            if len(payload) != raw_size or zlib.crc32(payload) != crc:
+                raise ValueError(f"chunk {index} is corrupted")
+            self._inflated = (index, payload)
+        return self._inflated[1]
+
+    def record(self, user_id: str):
+        """One user's dict, or None if the file does not hold it."""
+        span = self.users.get(user_id)
+        if span is None:
+            return None
+        chunk, start, end = span
+        with Metrics.span("storage.json_decode"):
+            return json.loads(self.payload(chunk)[start:end])
+
+    def chunk_records(self, index: int):
+        """Yields (user_id, JSON bytes) for every record in chunk `index`, in order."""
+        payload = self.payload(index)
+        pos = 0
+        while pos < len(payload):
+            (id_length,) = _ID_LENGTH.unpack_from(payload, pos)
+            pos += _ID_LENGTH.size
+            user_id = payload[pos:pos + id_length].decode("utf-8")
+            pos += id_length
+            (json_length,) = _JSON_LENGTH.unpack_from(payload, pos)
+            pos += _JSON_LENGTH.size
+            yield user_id, payload[pos:pos + json_length]
+            pos += json_length
+
+    def records(self):
+        """Yields (user_id, JSON bytes) for the whole file, one chunk inflated at a time."""
+        for index in range(len(self.chunks)):
+            yield from self.chunk_records(index)
+
+
+class RecordWriter:
+    """Writes a record file front to back; call close() to add the footer."""
+
+    def __init__(self, f, compression: str = RECORDS_COMPRESSION, chunk_bytes: int = RECORDS_CHUNK_BYTES):
+        if compression not in CODECS:
+            raise ValueError(f"unknown compression {compression!r}, expected one of {sorted(CODECS)}")
+        self._f = f
+        self.codec = CODECS[compression]
+        self.chunk_bytes = chunk_bytes
+        self.chunks = []
+        self.users = {}
+        self._pending = []  # Encoded records of the chunk being filled
+        self._pending_spans = []  # (user_id, start, end) inside that chunk
+        self._pending_size = 0
+        self._offset = f.write(MAGIC)
+
+    def add(self, user_id: str, json_bytes: bytes):
+        id_bytes = user_id.encode("utf-8")
+        prefix = _ID_LENGTH.pack(len(id_bytes)) + id_bytes + _JSON_LENGTH.pack(len(json_bytes))
+        start = self._pending_size + len(prefix)
+        self._pending += [prefix, json_bytes]
+        self._pending_spans.append((user_id, start, start + len(json_bytes)))
+        self._pending_size = start + len(json_bytes)
+        if self._pending_size >= self.chunk_bytes:
+            self.flush_chunk()
+
+    def copy_chunk(self, reader: RecordReader, index: int):
+        """Copies a chunk from another file without decompressing it."""
+        self.flush_chunk()
+        _, size, codec, raw_size, crc = reader.chunks[index]
+        new_index = len(self.chunks)
+        for user_id in reader.chunk_users(index):
+            self.users[user_id] = [new_index] + reader.users[user_id][1:]
+        self._write_chunk(reader.stored(index), codec, raw_size, crc)
+
+    def flush_chunk(self):
+        if not self._pending:
+            return
+        payload = b"".join(self._pending)
+        new_index = len(self.chunks)
+        for user_id, start, end in self._pending_spans:
+            self.users[user_id] = [new_index, start, end]
+        self._pending, self._pending_spans, self._pending_size = [], [], 0
+        self._write_chunk(_compress(self.codec, payload), self.codec, len(payload), zlib.crc32(payload))
+
+    def _write_chunk(self, stored: bytes, codec: int, raw_size: int, crc: int):
+        self.chunks.append([self._offset, len(stored), codec, raw_size, crc])
+        self._offset += self._f.write(stored)
+
+    def close(self) -> int:
+        """Writes the last chunk, footer and trailer. Returns the file size."""
+        self.flush_chunk()
+        footer = json.dumps({"chunks": self.chunks, "users": self.users}, separators=(",", ":")).encode("utf-8")
+        self._f.write(footer)
+        self._f.write(_TRAILER.pack(self._offset, len(footer)) + MAGIC)
+        return self._offset + len(footer) + _TRAILER.size + len(MAGIC)
+
+
+def _open_reader(path: str):
+    """(file, RecordReader) for path, or (None, None) if it is missing or empty.
+    An unreadable file is moved aside to path + ".backup" and reads as empty."""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None, None
+    try:
+        if os.fstat(f.fileno()).st_size == 0:
+            f.close()
+            return None, None
+        return f, RecordReader(f)
+    except (ValueError, KeyError, TypeError, struct.error) as e:
+        f.close()
+        print(f"--- Error reading '{path}': {e}. ---")
+        backup_file = path + ".backup"
+        os.replace(path, backup_file)
+        print(f"--- Corrupted file backed up to {backup_file} ---")
+        return None, None
+
+
+def _write_atomic(path: str, write):
+    """Calls write(f) on a temp file next to path, then renames it over path. Returns bytes written."""
+    temp_file = path + ".tmp"
+    try:
+        with Metrics.span("storage.tmp_write"), open(temp_file, 'wb') as f:
+            written = write(f)
+        with Metrics.span("storage.replace"):
+            os.replace(temp_file, path)
+        Metrics.increment("storage.bytes_written", written)
+        return written
+    except Exception:
+        if os.path.exists(temp_file):
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+        raise
+
+
+def write_records(path: str, updates: dict, compression: str = RECORDS_COMPRESSION,
+                  chunk_bytes: int = RECORDS_CHUNK_BYTES):
+    """
+    Stores {user_id: JSON bytes} in the record file at path, keeping every
+    other user. Only chunks holding an updated user (and the last chunk, when
+    new users are appended to it) are decompressed and rewritten.
+    """
+    updates = dict(updates)
+    with file_lock(path):
+        f, reader = _open_reader(path)
+        try:
+            def write(out):
+                nonlocal writer
+                writer = RecordWriter(out, compression, chunk_bytes)
+                if reader is not None:
+                    touched = {reader.users[uid][0] for uid in updates if uid in reader.users}
+                    last = len(reader.chunks) - 1
+                    new_users = any(uid not in reader.users for uid in updates)
+                    for index in range(len(reader.chunks)):
+                        grow_last = index == last and new_users and reader.chunks[index][3] < chunk_bytes
+                        if index in touched or grow_last:
+                            for user_id, json_bytes in reader.chunk_records(index):
+                                writer.add(user_id, updates.pop(user_id, json_bytes))
+                        else:
+                            writer.copy_chunk(reader, index)
+                for user_id, json_bytes in updates.items():
+                    writer.add(user_id, json_bytes)
+                return writer.close()
+
+            writer = None
+            _write_atomic(path, write)
+            stat = os.stat(path)  # The next reader can skip parsing the footer just written
+            _footers[os.path.abspath(path)] = ((stat.st_size, stat.st_mtime_ns, stat.st_ino),
+                                               writer.chunks, writer.users)
+        finally:
+            if f is not None:
+                f.close()
+
+
+class RecordStorage:
+    """Stores users in RECORDS_FILE using the chunked record format above."""
+
+    @staticmethod
+    def load_users(user_ids) -> dict:
+        """Loads several users, inflating each chunk involved once. Missing users are left out."""
+        f, reader = _open_reader(RECORDS_FILE)
+        if reader is None:
+            return {}
+        with f:
+            # Visiting ids in chunk order lets the reader reuse each inflated chunk
+            found = sorted((reader.users[uid], uid) for uid in user_ids if uid in reader.users)
+            return {uid: User.from_dict(reader.record(uid)) for _, uid in found}
+
+    @staticmethod
+    def iter_users():
+        """Yields every stored user in file order, one chunk inflated at a time."""
+        f, reader = _open_reader(RECORDS_FILE)
+        if reader is None:
+            return
+        with f:
+            for _, json_bytes in reader.records():
+                with Metrics.span("storage.json_decode"):
+                    record = json.loads(json_bytes)
+                yield User.from_dict(record)
+
+    @staticmethod
+    def load_user(user_id: str) -> User:
+        """Loads a user by inflating only the chunk that holds it."""
+        try:
+            users = RecordStorage.load_users([user_id])
+        except (OSError, ValueError) as e:
+            print(f"An unexpected error occurred during loading: {e}. Starting fresh.")
+            return User(user_id)
+        if user_id in users:
+            print(f"--- Data loaded successfully for User: {user_id} ---")
+            return users[user_id]
+        print(f"--- No data found for User: {user_id}. Creating new user. ---")
+        return User(user_id)
+
+    @staticmethod
+    def save_users(users, quiet: bool = False) -> bool:
+        """Saves several users, recompressing only the chunks they live in."""
+        users = list(users)
+        try:
+            write_records(RECORDS_FILE, {user.user_id: _encode(user.to_dict()) for user in users},
+                          RECORDS_COMPRESSION, RECORDS_CHUNK_BYTES)
+            if not quiet:
+                print(f"--- Data saved successfully ({len(users)} user(s)). ---")
+            return True
+        except PermissionError:
+            print(f"Error: Permission denied when saving to {RECORDS_FILE}")
+            return False
+        except Exception as e:
+            print(f"Error saving data: {e}")
+            return False
+
+    @staticmethod
+    def save_user(user: User):
+        """Saves one user."""
+        return RecordStorage.save_users([user])
+
+
+def json_to_records(json_path: str, records_path: str, compression: str = RECORDS_COMPRESSION,
+                    chunk_bytes: int = RECORDS_CHUNK_BYTES) -> int:
+    """Converts a JSON store (DATA_FILE layout) into a record file. Returns the number of users."""
+    with open(json_path, 'r', encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{json_path} does not hold a JSON object of users")
+
+    def write(out):
+        writer = RecordWriter(out, compression, chunk_bytes)
+        for user_id, record in data.items():
+            writer.add(user_id, _encode(record))
+        return writer.close()
+
+    with file_lock(records_path):
+        _write_atomic(records_path, write)
+    return len(data)
+
+
+def records_to_json(records_path: str, json_path: str) -> int:
+    """Converts a record file back into the JSON layout, one chunk at a time. Returns the number of users."""
+    count = 0
+    with open(records_path, 'rb') as f:
+        reader = RecordReader(f)
+
+        def write(out):
+            nonlocal count
+            written = 0
+            for user_id, json_bytes in reader.records():
+                prefix = (b",\n" if count else b"{\n") + b"    " + json.dumps(user_id).encode("utf-8") + b": "
+                record = json.dumps(json.loads(json_bytes), indent=4).replace("\n", "\n    ").encode("utf-8")
+                written += out.write(prefix) + out.write(record)
+                count += 1
+            return written + out.write(b"\n}" if count else b"{}")
+
+        with file_lock(json_path):
+            _write_atomic(json_path, write)
+    return count
+
+
+def main(args: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python record_format.py",
+                                     description="Convert between the JSON store and the record format.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    to_records = commands.add_parser("to-records", help="JSON store -> record file")
+    to_records.add_argument("source", nargs="?", default=DATA_FILE)
+    to_records.add_argument("target", nargs="?", default=RECORDS_FILE)
+    to_records.add_argument("--compression", choices=sorted(CODECS), default=RECORDS_COMPRESSION)
+    to_records.add_argument("--chunk-bytes", type=int, default=RECORDS_CHUNK_BYTES)
+    to_json = commands.add_parser("to-json", help="record file -> JSON store")
+    to_json.add_argument("source", nargs="?", default=RECORDS_FILE)
+    to_json.add_argument("target", nargs="?", default=DATA_FILE)
+    options = parser.parse_args(args)
+
+    try:
+        if options.command == "to-records":
+            count = json_to_records(options.source, options.target, options.compression, options.chunk_bytes)
+        else:
+            count = records_to_json(options.source, options.target)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    before, after = os.path.getsize(options.source), os.path.getsize(options.target)
+    print(f"Converted {count} user(s): {before} -> {after} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
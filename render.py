@@ -0,0 +1,259 @@
+"""
+Rendering and export of built schedules.
+
+render_schedule() and render_report() build the CLI's plan and
+target-vs-allocated text in one StringIO buffer, so the terminal gets a
+single write. csv_lines(), jsonl_lines() and ics_lines() turn
+(user_id, daily_plan) pairs into text one line at a time; feed them
+cohort_schedules() and write the lines as they come to export many users
+without holding the whole file in memory:
+
+    out.writelines(jsonl_lines(cohort_schedules(user_ids)))
+
+cohort_schedules() with no ids exports every user in one pass over the store.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import sys
+from datetime import date, datetime, timedelta, timezone
+from planner import StudyPlanner, WEEK_DAYS
+from storage import StorageManager
+from config import DEFAULT_USER_ID
+from timeslots import DEFAULT_DAY_START, format_time
+
+EXPORT_CHUNK_USERS = 500  # Users loaded per storage read by cohort_schedules
+_DAY_MINUTES = 24 * 60
+
+
+def render_schedule(user, daily_plan: dict, allocated_hours_map: dict, out: io.StringIO = None) -> str:
+    """The weekly schedule as _generate_and_view_plan shows it."""
+    out = out or io.StringIO()
+    write = out.write
+    write("\n--- Weekly Schedule Details ---\n")
+    for i, day in enumerate(WEEK_DAYS):
+        available_hours = user.study_slots[i] if i < len(user.study_slots) else 0
+        tasks = daily_plan.get(day, [])
+
+        write(f"\n--- {day} (Available: {available_hours:.1f} hrs) ---\n")
+        if not tasks:
+            write("   No tasks allocated.\n")
+            continue
+
+        current_day_hours = 0.0
+        for task in tasks:
+            write(f"   - {task}\n")
+            current_day_hours += task.hours_allocated
+        write(f"   (Total allocated for {day}: {current_day_hours:.2f} hrs)\n")
+
+    write("\n-----------------------------------------------------\n")
+    write(f"TOTAL ALLOCATED HOURS THIS WEEK: {sum(allocated_hours_map.values()):.2f} hrs\n")
+    write("-----------------------------------------------------\n")
+    return out.getvalue()
+
+
+def render_report(user, allocated_hours_map: dict, out: io.StringIO = None) -> str:
+    """The target vs allocated analysis as _display_analytics_report shows it."""
+    out = out or io.StringIO()
+    write = out.write
+    write("\n=====================================================\n")
+    write("          ANALYTICAL REPORT: TARGET VS. ALLOCATED      \n")
+    write("=====================================================\n")
+
+    if not user.subjects:
+        write("No subjects to analyze.\n")
+        return out.getvalue()
+
+    write(f"{'Subject':<20}{'Target Hrs':<12}{'Allocated Hrs':<15}{'Status':<20}\n")
+    write("-" * 67 + "\n")
+    for subject in user.subjects:
+        target = subject.target_hours
+        allocated = allocated_hours_map.get(subject.name, 0.0)
+        if target > 0:
+            if allocated >= target:
+                status = f"✓ MET (+{allocated - target:.1f}h)"
+            else:
+                status = f"✗ DEFICIT (-{target - allocated:.1f}h)"
+        else:
+            status = "Allocated" if allocated > 0 else "Not Scheduled"
+        write(f"{subject.name:<20}{target:<12.1f}{allocated:<15.2f}{status:<20}\n")
+
+    total_target = sum(s.target_hours for s in user.subjects)
+    total_allocated = sum(allocated_hours_map.values())
+    write("-" * 67 + "\n")
+    write(f"{'TOTAL':<20}{total_target:<12.1f}{total_allocated:<15.2f}\n")
+    if total_target > 0:
+        write(f"\nOverall Progress: {total_allocated / total_target * 100:.1f}% of target hours\n")
+    write("=====================================================\n\n")
+    return out.getvalue()
+
+
+def cohort_schedules(user_ids=None):
+    """
+    Yields (user_id, daily_plan) for each user. Up to EXPORT_CHUNK_USERS ids
+    are loaded in one read, in the order given; longer lists and None (every
+    user) are served by one pass over the store, in store order.
+    """
+    if user_ids is not None:
+        user_ids = list(dict.fromkeys(user_ids))
+        if len(user_ids) <= EXPORT_CHUNK_USERS:
+            with contextlib.redirect_stdout(sys.stderr):  # Keep load warnings out of an export on stdout
+                users = StorageManager.load_users(user_ids)
+            for user_id, user in users.items():
+                yield user_id, _week(user)
+            return
+        wanted = set(user_ids)
+
+    users = StorageManager.iter_users(EXPORT_CHUNK_USERS)
+    while True:
+        with contextlib.redirect_stdout(sys.stderr):
+            user = next(users, None)
+        if user is None:
+            return
+        if user_ids is None or user.user_id in wanted:
+            yield user.user_id, _week(user)
+
+
+def _week(user) -> dict:
+    # Not build_schedule: each user is planned once, so PlanCache would only evict hot
+    # users and, with PLAN_CACHE_DISK, write a file per exported user
+    return StudyPlanner.lay_out(user, StudyPlanner.generate_plan(user))[0]
+
+
+def _timed_tasks(daily_plan: dict, week_start: date):
+    """
+    Yields (day label, date, start minute, end minute, task) in schedule order.
+    Hours-only tasks run back to back from 09:00, or from early enough to end
+    by midnight. A start past midnight moves to the next date; the end is on
+    the start's date and may pass 24:00.
+    """
+    for index, (day, tasks) in enumerate(daily_plan.items()):
+        if isinstance(day, date):
+            day_date = day
+        else:
+            day_date = week_start + timedelta(days=WEEK_DAYS.index(day) if day in WEEK_DAYS else index)
+        untimed = sum(round(task.hours_allocated * 60) for task in tasks if getattr(task, "start", None) is None)
+        cursor = max(0, min(DEFAULT_DAY_START, _DAY_MINUTES - untimed))
+        for task in tasks:
+            start = getattr(task, "start", None)
+            if start is None:
+                start = cursor
+                end = start + round(task.hours_allocated * 60)
+            else:
+                end = task.end
+            cursor = end
+            days, start = divmod(start, _DAY_MINUTES)
+            yield str(day), day_date + timedelta(days=days), start, end - days * _DAY_MINUTES, task
+
+
+def _clock(minutes: int) -> str:
+    """"HH:MM"; an end at midnight is 24:00 and later ends wrap (00:30)."""
+    return format_time(minutes if minutes == _DAY_MINUTES else minutes % _DAY_MINUTES)
+
+
+def csv_lines(schedules, week_start: date = None):
+    """CSV with a header row, then one row per task."""
+    week_start = week_start or _this_monday()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def take_line():
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(["user_id", "day", "date", "start", "end", "subject", "topic", "hours"])
+    yield take_line()
+    for user_id, daily_plan in schedules:
+        for day, day_date, start, end, task in _timed_tasks(daily_plan, week_start):
+            writer.writerow([user_id, day, day_date.isoformat(), _clock(start), _clock(end),
+                             task.subject_name, task.topic, round(task.hours_allocated, 4)])
+            yield take_line()
+
+
+def jsonl_lines(schedules, week_start: date = None):
+    """One JSON object per task."""
+    week_start = week_start or _this_monday()
+    for user_id, daily_plan in schedules:
+        for day, day_date, start, end, task in _timed_tasks(daily_plan, week_start):
+            yield json.dumps({"user_id": user_id, "day": day, "date": day_date.isoformat(),
+                              "start": _clock(start), "end": _clock(end), "subject": task.subject_name,
+                              "topic": task.topic, "hours": round(task.hours_allocated, 4)}) + "\n"
+
+
+def _ics_escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _ics_fold(line: str) -> str:
+    """Folds a content line at 75 octets as RFC 5545 requires, without splitting characters."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1  # Do not split a UTF-8 sequence
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74  # Continuation lines start with a space
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def ics_lines(schedules, week_start: date = None):
+    """An iCalendar file with one event per task (floating local times)."""
+    week_start = week_start or _this_monday()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield "BEGIN:VCALENDAR\r\n"
+    yield "VERSION:2.0\r\n"
+    yield "PRODID:-//Study Planner//EN\r\n"
+    for user_id, daily_plan in schedules:
+        for n, (day, day_date, start, end, task) in enumerate(_timed_tasks(daily_plan, week_start)):
+            day_stamp = day_date.strftime("%Y%m%d")
+            yield "BEGIN:VEVENT\r\n"
+            yield _ics_fold(f"UID:{_ics_escape(user_id)}-{day_stamp}-{n}@study-planner")
+            yield f"DTSTAMP:{stamp}\r\n"
+            yield f"DTSTART:{day_stamp}T{start // 60:02d}{start % 60:02d}00\r\n"
+            end_date = day_date + timedelta(days=end // _DAY_MINUTES)
+            end = end % _DAY_MINUTES
+            yield f"DTEND:{end_date.strftime('%Y%m%d')}T{end // 60:02d}{end % 60:02d}00\r\n"
+            yield _ics_fold(f"SUMMARY:{_ics_escape(task.subject_name)}: {_ics_escape(task.topic)}")
+            yield _ics_fold(f"CATEGORIES:{_ics_escape(user_id)}")
+            yield "END:VEVENT\r\n"
+    yield "END:VCALENDAR\r\n"
+
+
+EXPORT_FORMATS = {"csv": csv_lines, "jsonl": jsonl_lines, "ics": ics_lines}
+
+
+def _this_monday() -> date:
+    today = date.today()
+    return today - timedelta(days=today.weekday())
+
+
+def main(args: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python CLI.py export", description="Export weekly schedules.")
+    parser.add_argument("format", choices=sorted(EXPORT_FORMATS))
+    parser.add_argument("user_ids", nargs="*", metavar="USER_ID",
+                        help=f"users to export (default: {DEFAULT_USER_ID})")
+    parser.add_argument("--all", action="store_true", help="export every stored user")
+    parser.add_argument("-o", "--out", default="-", help="output file (default: stdout)")
+    parser.add_argument("--week-start", type=date.fromisoformat, default=None,
+                        help="date of the week's Monday, YYYY-MM-DD (default: this week)")
+    options = parser.parse_intermixed_args(args)
+    if options.all and options.user_ids:
+        parser.error("give user ids or --all, not both")
+
+    user_ids = None if options.all else options.user_ids or [DEFAULT_USER_ID]
+    lines = EXPORT_FORMATS[options.format](cohort_schedules(user_ids), options.week_start)
+    with contextlib.ExitStack() as stack:
+        out = (sys.stdout if options.out == "-"
+               else stack.enter_context(open(options.out, 'w', encoding="utf-8", newline="")))
+        out.writelines(lines)  # Lines carry their own endings (CRLF for ICS)
+    return 0
@@ -0,0 +1,363 @@
+"""
+Local JSON-over-HTTP service for the planner (stdlib asyncio only).
+
+    python server.py [--host 127.0.0.1] [--port 8765]
+
+Endpoints:
+    GET    /health
+    GET    /users/{user_id}                   -> stored user
+    POST   /users/{user_id}/subjects          {"name", "weight", "target_hours"}
+    DELETE /users/{user_id}/subjects/{name}
+    PUT    /users/{user_id}/slots             {"slots": [hours, ...]}
+    GET    /users/{user_id}/plan              -> weekly schedule ("start"/"end" with time slots)
+    POST   /flush                             -> write pending changes now
+
+Hot users are kept in a bounded LRU cache, so storage is only read on a
+miss. Changes are written behind: dirty users are saved together every
+SERVER_FLUSH_INTERVAL seconds (the operation log keeps them crash-safe in
+between). Each cached user has a lock: changes run on a worker thread while
+holding it, so the log's disk sync never blocks the loop, and a flush holds
+the locks of the users it saves until their log checkpoint is written, so a
+checkpoint never covers a change the saved copy lacks. Planning runs in a
+process pool so it does not block the loop.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote, urlsplit
+from models import User
+from storage import StorageManager
+from planner import StudyPlanner, SubjectManager
+from timeslots import TimedTask, format_time
+from config import SERVER_HOST, SERVER_PORT, SERVER_CACHE_SIZE, SERVER_FLUSH_INTERVAL, SERVER_PLAN_WORKERS
+
+MAX_BODY_BYTES = 1024 * 1024
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class UserCache:
+    """LRU cache of User objects with write-behind persistence."""
+
+    def __init__(self, capacity: int = SERVER_CACHE_SIZE):
+        self.capacity = capacity
+        self._users = OrderedDict()
+        self._dirty = set()
+        self._loading = {}  # user_id -> Future, so concurrent misses load once
+        self._locks = {}  # user_id -> asyncio.Lock guarding reads and changes of that user
+        self._pins = {}  # user_id -> requests holding that user, which keep it cached
+        self._flush_lock = asyncio.Lock()
+
+    def lock(self, user_id: str) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    @contextlib.asynccontextmanager
+    async def checkout(self, user_id: str):
+        """
+        The cached user for one request. It is not evicted until the block exits,
+        so a change the request makes is still in the cache to be flushed.
+        """
+        self._pins[user_id] = self._pins.get(user_id, 0) + 1
+        try:
+            yield await self.get(user_id)
+        finally:
+            self._pins[user_id] -= 1
+            if not self._pins[user_id]:
+                del self._pins[user_id]
+
+    async def get(self, user_id: str) -> User:
+        user = self._users.get(user_id)
+        if user is not None:
+            self._users.move_to_end(user_id)
+            return user
+
+        pending = self._loading.get(user_id)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = loop.run_in_executor(None, _load_user, user_id)
+            self._loading[user_id] = pending
+            try:
+                user = await pending
+            finally:
+                del self._loading[user_id]
+            self._users[user_id] = user
+            await self._evict()
+            return user
+        return await pending
+
+    def mark_dirty(self, user: User):
+        self._dirty.add(user.user_id)
+
+    def _drop_clean(self):
+        for user_id in list(self._users):
+            if len(self._users) <= self.capacity:
+                return
+            if user_id not in self._dirty and user_id not in self._pins:
+                del self._users[user_id]
+                lock = self._locks.get(user_id)
+                if lock is not None and not lock.locked():
+                    del self._locks[user_id]
+
+    async def _evict(self):
+        """Drops least recently used clean, unused users, flushing first if too many are dirty."""
+        self._drop_clean()
+        if len(self._users) > self.capacity:
+            await self.flush()
+            self._drop_clean()
+
+    async def flush(self) -> int:
+        """Writes all dirty users in one bulk save. Returns how many were written."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            user_ids = sorted(uid for uid in self._dirty if uid in self._users)
+            async with contextlib.AsyncExitStack() as held:
+                # Changes to these users wait until save_users has also written the log
+                # checkpoint; a change logged before it would be marked as saved
+                for user_id in user_ids:
+                    await held.enter_async_context(self.lock(user_id))
+                users = [self._users[uid] for uid in user_ids]
+                self._dirty.difference_update(user_ids)
+                loop = asyncio.get_running_loop()
+                saved = await loop.run_in_executor(None, lambda: StorageManager.save_users(users, quiet=True))
+            if not saved:
+                self._dirty.update(user_ids)
+                return 0
+            return len(users)
+
+    async def flush_periodically(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+
+def _load_user(user_id: str) -> User:
+    # load_users does not print, unlike load_user
+    return StorageManager.load_users([user_id])[user_id]
+
+
+def _task_to_json(task) -> dict:
+    data = {"subject": task.subject_name, "topic": task.topic, "hours": round(task.hours_allocated, 4)}
+    if isinstance(task, TimedTask):
+        data["start"], data["end"] = format_time(task.start), format_time(task.end)
+    return data
+
+
+def _schedule_to_json(schedule: tuple) -> dict:
+    plan, daily_plan, allocated_hours_map = schedule
+    return {
+        "days": {day: [_task_to_json(t) for t in tasks] for day, tasks in daily_plan.items()},
+        "allocated": {name: round(hours, 4) for name, hours in allocated_hours_map.items()},
+        "total_hours": round(sum(allocated_hours_map.values()), 4),
+    }
+
+
+class _ThreadStdout(io.TextIOBase):
+    """sys.stdout stand-in that sends a thread's prints to its own buffer while it has one."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer if buffer is not None else self.stream).write(text)
+
+    def flush(self):
+        if getattr(self.local, "buffer", None) is None:
+            self.stream.flush()
+
+
+_stdout_lock = threading.Lock()
+
+
+def _call_quietly(func, *args):
+    """
+    Runs a SubjectManager call and returns (result, the message it printed).
+    Only this thread's output is captured; other threads keep printing normally.
+    """
+    with _stdout_lock:
+        if not isinstance(sys.stdout, _ThreadStdout):
+            sys.stdout = _ThreadStdout(sys.stdout)
+        capture = sys.stdout
+    capture.local.buffer = buffer = io.StringIO()
+    try:
+        result = func(*args)
+    finally:
+        capture.local.buffer = None
+    return result, buffer.getvalue().strip()
+
+
+class PlannerServer:
+    def __init__(self, cache: UserCache = None, plan_workers: int = SERVER_PLAN_WORKERS):
+        self.cache = cache or UserCache()
+        # 0 workers plans on the default thread pool (handy for tests and tiny hosts)
+        self.plan_executor = ProcessPoolExecutor(max_workers=plan_workers) if plan_workers else None
+
+    async def handle_request(self, method: str, path: str, body: dict) -> tuple[int, dict]:
+        parts = [unquote(p) for p in urlsplit(path).path.strip("/").split("/") if p]
+
+        if parts == ["health"] and method == "GET":
+            return 200, {"status": "ok"}
+        if parts == ["flush"] and method == "POST":
+            return 200, {"saved": await self.cache.flush()}
+        if len(parts) < 2 or parts[0] != "users":
+            raise HttpError(404, "not found")
+
+        async with self.cache.checkout(parts[1]) as user:
+            return await self._handle_user_request(method, user, parts[2:], body)
+
+    async def _handle_user_request(self, method: str, user: User, route: list, body: dict) -> tuple[int, dict]:
+        if route == [] and method == "GET":
+            async with self.cache.lock(user.user_id):
+                return 200, user.to_dict()
+        if route == ["plan"] and method == "GET":
+            async with self.cache.lock(user.user_id):
+                snapshot = User.from_dict(user.to_dict())
+            loop = asyncio.get_running_loop()
+            schedule = await loop.run_in_executor(self.plan_executor, StudyPlanner.build_schedule, snapshot)
+            return 200, _schedule_to_json(schedule)
+        if route == ["subjects"] and method == "POST":
+            try:
+                args = (user, str(body["name"]), int(body["weight"]), float(body.get("target_hours", 0.0)))
+            except (KeyError, TypeError, ValueError) as e:
+                raise HttpError(400, f"invalid subject: {e}")
+            return await self._mutate(user, SubjectManager.add_subject, *args)
+        if len(route) == 2 and route[0] == "subjects" and method == "DELETE":
+            return await self._mutate(user, SubjectManager.remove_subject, user, route[1], missing_status=404)
+        if route == ["slots"] and method == "PUT":
+            try:
+                slots = [float(h) for h in body["slots"]]
+            except (KeyError, TypeError, ValueError) as e:
+                raise HttpError(400, f"invalid slots: {e}")
+            return await self._mutate(user, SubjectManager.set_study_slots, user, slots)
+
+        if route in ([], ["plan"], ["subjects"], ["slots"]) or (route and route[0] == "subjects"):
+            raise HttpError(405, "method not allowed")
+        raise HttpError(404, "not found")
+
+    async def _mutate(self, user: User, func, *args, missing_status: int = 400):
+        """Runs a SubjectManager change on a worker thread (it syncs the operation log) under the user's lock."""
+        async with self.cache.lock(user.user_id):
+            loop = asyncio.get_running_loop()
+            ok, message = await loop.run_in_executor(None, _call_quietly, func, *args)
+            if not ok:
+                raise HttpError(missing_status, message or "request rejected")
+            self.cache.mark_dirty(user)
+            return 200, {"ok": True, "message": message, "user": user.to_dict()}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+                status, payload = await self._dispatch(method, path, headers, reader)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            # Cancelled when the server shuts down with the connection still open
+            with contextlib.suppress(ConnectionError, asyncio.CancelledError):
+                await writer.wait_closed()
+
+    async def _dispatch(self, method: str, path: str, headers: dict, reader) -> tuple[int, dict]:
+        try:
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_BYTES:
+                raise HttpError(413, "request body too large")
+            body = {}
+            if length:
+                try:
+                    body = json.loads(await reader.readexactly(length))
+                except ValueError:
+                    raise HttpError(400, "body must be JSON")
+            return await self.handle_request(method.upper(), path, body if isinstance(body, dict) else {})
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"unexpected error: {e}"}
+
+    @staticmethod
+    async def _respond(writer, status: int, payload: dict, keep_alive: bool):
+        body = json.dumps(payload).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host: str = SERVER_HOST, port: int = SERVER_PORT,
+                    flush_interval: float = SERVER_FLUSH_INTERVAL, ready=None):
+        """Runs until cancelled, then writes any pending changes."""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        flusher = asyncio.create_task(self.cache.flush_periodically(flush_interval))
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            flusher.cancel()
+            await self.cache.flush()
+            if self.plan_executor is not None:
+                self.plan_executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Study Planner HTTP service")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_PLAN_WORKERS,
+                        help="planning processes (0 = use threads)")
+    args = parser.parse_args()
+
+    app = PlannerServer(plan_workers=args.workers)
+    print(f"Study Planner service listening on http://{args.host}:{args.port} (pid {os.getpid()})")
+    try:
+        asyncio.run(app.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import threading
+from models import User, Subject
+from config import SQLITE_FILE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    time_slot_days INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS subjects (
+    user_id TEXT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    weight INTEGER NOT NULL,
+    target_hours REAL NOT NULL DEFAULT 0.0,
+    PRIMARY KEY (user_id, position)
+);
+CREATE TABLE IF NOT EXISTS study_slots (
+    user_id TEXT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    day_index INTEGER NOT NULL,
+    hours REAL NOT NULL,
+    PRIMARY KEY (user_id, day_index)
+);
+CREATE TABLE IF NOT EXISTS slot_overrides (
+    user_id TEXT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    day TEXT NOT NULL,
+    hours REAL NOT NULL,
+    PRIMARY KEY (user_id, day)
+);
+CREATE TABLE IF NOT EXISTS time_slots (
+    user_id TEXT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    day_index INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    span TEXT NOT NULL,
+    PRIMARY KEY (user_id, day_index, position)
+);
+CREATE INDEX IF NOT EXISTS idx_subjects_user ON subjects(user_id);
+CREATE INDEX IF NOT EXISTS idx_subjects_user_name ON subjects(user_id, lower(name));
+CREATE INDEX IF NOT EXISTS idx_study_slots_user ON study_slots(user_id);
+"""
+
+# SQLite limits the number of "?" parameters per statement
+_MAX_PARAMS = 500
+
+
+class SqliteStorage:
+    """
+    Stores users in a SQLite database (SQLITE_FILE) with one table each for
+    users, subjects, study slots, dated slot overrides and time-of-day
+    slots. A single connection is reused for the
+    whole process and bulk loads/saves run inside one transaction.
+    """
+    _connection = None
+    _connection_key = None  # (pid, absolute db path) the connection was opened for
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _connect() -> sqlite3.Connection:
+        """Returns the process-wide connection, reopening it after a fork or a path change."""
+        key = (os.getpid(), os.path.abspath(SQLITE_FILE))
+        if SqliteStorage._connection is not None and SqliteStorage._connection_key == key:
+            return SqliteStorage._connection
+
+        conn = sqlite3.connect(SQLITE_FILE, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SCHEMA)
+        if "time_slot_days" not in {row[1] for row in conn.execute("PRAGMA table_info(users)")}:
+            # Databases from before days without intervals were kept
+            conn.execute("ALTER TABLE users ADD COLUMN time_slot_days INTEGER NOT NULL DEFAULT 0")
+        SqliteStorage._connection = conn
+        SqliteStorage._connection_key = key
+        return conn
+
+    @staticmethod
+    def close():
+        """Closes the shared connection (it is reopened on next use)."""
+        with SqliteStorage._lock:
+            if SqliteStorage._connection is not None:
+                SqliteStorage._connection.close()
+            SqliteStorage._connection = None
+            SqliteStorage._connection_key = None
+
+    @staticmethod
+    def load_users(user_ids) -> dict:
+        """
+        Loads several users in one transaction, so every chunk of ids reads
+        the same snapshot. Returns {user_id: User} for the ids that exist in
+        the database.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        users = {}
+        with SqliteStorage._lock:
+            conn = SqliteStorage._connect()
+            # The sqlite3 module only opens transactions for writes; reads need an explicit one
+            conn.execute("BEGIN")
+            try:
+                for start in range(0, len(user_ids), _MAX_PARAMS):
+                    chunk = user_ids[start:start + _MAX_PARAMS]
+                    placeholders = ",".join("?" * len(chunk))
+
+                    for user_id, time_slot_days in conn.execute(
+                            f"SELECT user_id, time_slot_days FROM users WHERE user_id IN ({placeholders})", chunk):
+                        users[user_id] = User(user_id)
+                        users[user_id].time_slots = [[] for _ in range(time_slot_days)]
+
+                    for user_id, name, weight, target_hours in conn.execute(
+                            f"SELECT user_id, name, weight, target_hours FROM subjects "
+                            f"WHERE user_id IN ({placeholders}) ORDER BY user_id, position", chunk):
+                        users[user_id].subjects.append(Subject(name, weight, target_hours))
+
+                    for user_id, hours in conn.execute(
+                            f"SELECT user_id, hours FROM study_slots "
+                            f"WHERE user_id IN ({placeholders}) ORDER BY user_id, day_index", chunk):
+                        users[user_id].study_slots.append(hours)
+
+                    for user_id, day, hours in conn.execute(
+                            f"SELECT user_id, day, hours FROM slot_overrides "
+                            f"WHERE user_id IN ({placeholders})", chunk):
+                        users[user_id].slot_overrides[day] = hours
+
+                    for user_id, day_index, span in conn.execute(
+                            f"SELECT user_id, day_index, span FROM time_slots "
+                            f"WHERE user_id IN ({placeholders}) ORDER BY user_id, day_index, position", chunk):
+                        time_slots = users[user_id].time_slots
+                        while len(time_slots) < max(day_index + 1, len(users[user_id].study_slots)):
+                            time_slots.append([])
+                        time_slots[day_index].append(span)
+            finally:
+                conn.execute("COMMIT")
+        return users
+
+    @staticmethod
+    def save_users(users, quiet: bool = False) -> bool:
+        """Saves several users in one transaction, replacing their subjects and slots."""
+        users = list(users)
+        try:
+            with SqliteStorage._lock:
+                conn = SqliteStorage._connect()
+                with conn:
+                    for user in users:
+                        conn.execute(
+                            "INSERT INTO users (user_id, time_slot_days) VALUES (?, ?) "
+                            "ON CONFLICT (user_id) DO UPDATE SET time_slot_days = excluded.time_slot_days",
+                            (user.user_id, len(user.time_slots)))
+                        conn.execute("DELETE FROM subjects WHERE user_id = ?", (user.user_id,))
+                        conn.execute("DELETE FROM study_slots WHERE user_id = ?", (user.user_id,))
+                        conn.execute("DELETE FROM slot_overrides WHERE user_id = ?", (user.user_id,))
+                        conn.execute("DELETE FROM time_slots WHERE user_id = ?", (user.user_id,))
+                        conn.executemany(
+                            "INSERT INTO subjects (user_id, position, name, weight, target_hours) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            [(user.user_id, i, s.name, s.weight, s.target_hours)
+                             for i, s in enumerate(user.subjects)])
+                        conn.executemany(
+                            "INSERT INTO study_slots (user_id, day_index, hours) VALUES (?, ?, ?)",
+                            [(user.user_id, i, hours) for i, hours in enumerate(user.study_slots)])
+                        conn.executemany(
+                            "INSERT INTO slot_overrides (user_id, day, hours) VALUES (?, ?, ?)",
+                            [(user.user_id, day, hours) for day, hours in user.slot_overrides.items()])
+                        conn.executemany(
+                            "INSERT INTO time_slots (user_id, day_index, position, span) VALUES (?, ?, ?, ?)",
+                            [(user.user_id, day_index, position, span)
+                             for day_index, spans in enumerate(user.time_slots)
+                             for position, span in enumerate(spans)])
+            if not quiet:
+                print(f"--- Data saved successfully ({len(users)} user(s)). ---")
+            return True
+        except sqlite3.Error as e:
+            print(f"Error saving data to {SQLITE_FILE}: {e}")
+            return False
+
+    @staticmethod
+    def iter_users():
+        """Yields every stored user, loading _MAX_PARAMS users at a time in user_id order."""
+        last = ""
+        while True:
+            with SqliteStorage._lock:
+                user_ids = [user_id for (user_id,) in SqliteStorage._connect().execute(
+                    "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?", (last, _MAX_PARAMS))]
+            if not user_ids:
+                return
+            users = SqliteStorage.load_users(user_ids)
+            yield from (users[user_id] for user_id in user_ids if user_id in users)
+            last = user_ids[-1]
+
+    @staticmethod
+    def load_user(user_id: str) -> User:
+        """Loads a single user, creating a new one if it is not in the database."""
+        try:
+            users = SqliteStorage.load_users([user_id])
+        except sqlite3.Error as e:
+            print(f"An unexpected error occurred during loading: {e}. Starting fresh.")
+            return User(user_id)
+
+        if user_id in users:
+            print(f"--- Data loaded successfully for User: {user_id} ---")
+            return users[user_id]
+        print(f"--- No data found for User: {user_id}. Creating new user. ---")
+        return User(user_id)
+
+    @staticmethod
+    def save_user(user: User):
+        """Saves a single user."""
+        return SqliteStorage.save_users([user])
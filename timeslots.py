@@ -0,0 +1,256 @@
+"""
+Time-of-day availability: each weekday holds intervals like "09:00-11:30"
+instead of just a number of hours, and sessions get concrete start/end times.
+
+Times are whole minutes since midnight. A day's free time is kept in
+FreeBlocks, a segment tree over its sorted free intervals that finds the
+earliest block with room for a session in O(log n), so heavily fragmented
+days stay cheap to fill. TimeSlotScheduler fills each day from the earliest
+free time onwards, never places a session shorter than MIN_TASK_DURATION,
+and keeps one subject to at most MAX_CONSECUTIVE_HOURS without a break.
+"""
+import heapq
+from models import User, Task
+from planner import StudyPlanner, DayScheduler, WEEK_DAYS
+from config import MIN_TASK_DURATION
+
+DEFAULT_DAY_START = 9 * 60  # Hours-only users get one block per day starting at 09:00
+
+
+def parse_time(text: str) -> int:
+    """"HH:MM" -> minutes since midnight ("24:00" is allowed as an end time)."""
+    hours, sep, minutes = text.strip().partition(":")
+    if not sep or not hours.isdigit() or not minutes.isdigit() or len(minutes) != 2:
+        raise ValueError(f"invalid time {text!r}, expected HH:MM")
+    value = int(hours) * 60 + int(minutes)
+    if int(minutes) >= 60 or value > 24 * 60:
+        raise ValueError(f"invalid time {text!r}")
+    return value
+
+
+def format_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_interval(text: str) -> tuple[int, int]:
+    """"09:00-11:30" -> (540, 690)."""
+    start, sep, end = text.partition("-")
+    if not sep:
+        raise ValueError(f"invalid interval {text!r}, expected HH:MM-HH:MM")
+    start, end = parse_time(start), parse_time(end)
+    if end <= start:
+        raise ValueError(f"interval {text!r} ends before it starts")
+    return start, end
+
+
+def format_interval(start: int, end: int) -> str:
+    return f"{format_time(start)}-{format_time(end)}"
+
+
+def merge_intervals(intervals) -> list[tuple[int, int]]:
+    """Sorts intervals and merges the ones that overlap or touch."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def intervals_for(user: User) -> list[list[tuple[int, int]]]:
+    """The user's parsed time_slots, or one block per day sized from study_slots."""
+    if user.time_slots:
+        return [merge_intervals(parse_interval(text) for text in day) for day in user.time_slots]
+    return [[(DEFAULT_DAY_START, DEFAULT_DAY_START + round(hours * 60))] if hours > 0 else []
+            for hours in user.study_slots]
+
+
+class TimedTask(Task):
+    """A Task with a start and end time (minutes since midnight)."""
+    __slots__ = ("start", "end")
+
+    def __init__(self, subject_name: str, topic: str, start: int, end: int):
+        super().__init__(subject_name, topic, (end - start) / 60)
+        self.start = start
+        self.end = end
+
+    def __str__(self):
+        return f"{format_interval(self.start, self.end)} [{self.subject_name}] Study {self.topic}"
+
+    def copy(self):
+        return TimedTask(self.subject_name, self.topic, self.start, self.end)
+
+
+class FreeBlocks:
+    """
+    The free [start, end) blocks of one day. A segment tree holds the longest
+    free block under each node, so first_fit() and take() are O(log n).
+    """
+    __slots__ = ("starts", "ends", "_size", "_tree")
+
+    def __init__(self, intervals):
+        merged = merge_intervals(intervals)
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+        size = 1
+        while size < len(merged):
+            size *= 2
+        self._size = size
+        self._tree = [0] * (2 * size)
+        for i, (start, end) in enumerate(merged):
+            self._tree[size + i] = end - start
+        for node in range(size - 1, 0, -1):
+            self._tree[node] = max(self._tree[2 * node], self._tree[2 * node + 1])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def free_minutes(self) -> int:
+        return sum(end - start for start, end in zip(self.starts, self.ends))
+
+    def first_fit(self, minutes: int, lo: int = 0):
+        """Index of the earliest block at or after `lo` with at least `minutes` free, or None."""
+        if minutes <= 0 or self._tree[1] < minutes or lo >= len(self.starts):
+            return None
+        if lo == 0:
+            node = 1
+            while node < self._size:
+                node = 2 * node if self._tree[2 * node] >= minutes else 2 * node + 1
+            return node - self._size
+
+        def descend(node, node_lo, node_hi):
+            if node_hi <= lo or self._tree[node] < minutes:
+                return None
+            if node >= self._size:
+                return node - self._size
+            mid = (node_lo + node_hi) // 2
+            found = descend(2 * node, node_lo, mid)
+            return found if found is not None else descend(2 * node + 1, mid, node_hi)
+
+        return descend(1, 0, self._size)
+
+    def take(self, index: int, minutes: int) -> tuple[int, int]:
+        """Uses `minutes` from the front of block `index` and returns the (start, end) used."""
+        start = self.starts[index]
+        minutes = min(minutes, self.ends[index] - start)
+        self.starts[index] = start + minutes
+        node = self._size + index
+        self._tree[node] = self.ends[index] - self.starts[index]
+        node //= 2
+        while node:
+            self._tree[node] = max(self._tree[2 * node], self._tree[2 * node + 1])
+            node //= 2
+        return start, start + minutes
+
+
+class TimeSlotScheduler(DayScheduler):
+    """
+    DayScheduler for time intervals. Each session goes into the earliest free
+    block that can hold MIN_TASK_DURATION, for the subject with the most time
+    left; back-to-back sessions of one subject count towards the consecutive
+    cap, and a gap between blocks counts as a break. Leftovers shorter than
+    MIN_TASK_DURATION are not placed.
+    """
+
+    def __init__(self, max_consecutive_hours: float = StudyPlanner.MAX_CONSECUTIVE_HOURS,
+                 min_task_hours: float = MIN_TASK_DURATION):
+        super().__init__(max_consecutive_hours)
+        self.min_task_minutes = max(1, round(min_task_hours * 60))
+        self.max_consecutive_minutes = round(max_consecutive_hours * 60)
+
+    def schedule(self, plan, day_intervals: list, subjects=None, day_names: list = WEEK_DAYS) -> tuple[dict, dict]:
+        """
+        Returns (daily_plan, allocated_hours_map): {day: [TimedTask]} in time
+        order for every day in day_names, and {subject name: hours placed}.
+        """
+        daily_plan = {day: [] for day in day_names}
+        allocated_hours_map = {s.name: 0.0 for s in subjects} if subjects is not None else {}
+
+        queues = self._task_queues(plan)
+        remaining = {name: round(sum(hours * count for _, hours, count, _ in queue) * 60)
+                     for name, queue in queues.items()}
+        order = {name: i for i, name in enumerate(queues)}
+        heap = [(-minutes, order[name], name) for name, minutes in remaining.items()
+                if minutes >= self.min_task_minutes]
+        heapq.heapify(heap)
+
+        def pop_current():
+            while heap:
+                neg_minutes, _, name = heapq.heappop(heap)
+                if -neg_minutes == remaining[name] and remaining[name] >= self.min_task_minutes:
+                    return name
+            return None
+
+        for day, intervals in zip(day_names, day_intervals):
+            blocks = FreeBlocks(intervals)
+            day_tasks = daily_plan[day]
+            last_subject, last_end, consecutive = None, None, 0
+            first_block = 0
+
+            while True:
+                index = blocks.first_fit(self.min_task_minutes, first_block)
+                if index is None:
+                    break
+                block_start = blocks.starts[index]
+                if block_start != last_end:
+                    last_subject, consecutive = None, 0  # A gap is a break
+
+                subject_name = pop_current()
+                if subject_name is None:
+                    break
+                if (subject_name == last_subject
+                        and self.max_consecutive_minutes - consecutive < self.min_task_minutes):
+                    other = pop_current()
+                    heapq.heappush(heap, (-remaining[subject_name], order[subject_name], subject_name))
+                    if other is None:
+                        # Nothing else to study here: continue after the gap to the next block
+                        first_block = index + 1
+                        continue
+                    subject_name = other
+                if subject_name != last_subject:
+                    consecutive = 0
+
+                minutes = min(remaining[subject_name],
+                              blocks.ends[index] - block_start,
+                              self.max_consecutive_minutes - consecutive)
+                start, end = blocks.take(index, minutes)
+                self._place(queues[subject_name], subject_name, start, end, day_tasks)
+
+                allocated_hours_map[subject_name] = allocated_hours_map.get(subject_name, 0.0) + minutes / 60
+                remaining[subject_name] -= minutes
+                consecutive += minutes
+                last_subject, last_end = subject_name, end
+                if remaining[subject_name] >= self.min_task_minutes:
+                    heapq.heappush(heap, (-remaining[subject_name], order[subject_name], subject_name))
+
+        return daily_plan, allocated_hours_map
+
+    def _place(self, queue: list, subject_name: str, start: int, end: int, day_tasks: list):
+        """Splits one session into the subject's plan tasks, in plan order."""
+        cursor = start
+        while cursor < end and queue:
+            run = queue[-1]
+            topic, task_hours, tasks_left, current = run
+            portion = min(round(current * 60), end - cursor)
+            if portion <= 0:
+                queue.pop()
+                continue
+            day_tasks.append(TimedTask(subject_name, topic, cursor, cursor + portion))
+            cursor += portion
+            if round(current * 60) - portion > 0:
+                run[3] = current - portion / 60
+            elif tasks_left > 1:
+                run[2] = tasks_left - 1
+                run[3] = task_hours
+            else:
+                queue.pop()
+
+
+def build_timed_schedule(user: User, scheduler: TimeSlotScheduler = None) -> tuple:
+    """Like StudyPlanner.build_schedule, with sessions placed at concrete times."""
+    plan = StudyPlanner.generate_plan(user)
+    daily_plan, allocated_hours_map = (scheduler or TimeSlotScheduler()).schedule(
+        plan, intervals_for(user), user.subjects)
+    return plan, daily_plan, allocated_hours_map
@@ -0,0 +1,96 @@
+"""
+Vectorized allocation engine for planning large batches of users at once.
+
+Weights and study slots for N users are packed into zero-padded matrices and
+the proportional split is computed with a handful of array operations. The
+arithmetic follows StudyPlanner.allocate_hours step by step (sums are taken
+left to right, then avail * (weight / total_weight)) so the results are
+bit-for-bit identical to the scalar path. Only the "proportional"
+ALLOCATION_STRATEGY is vectorized; under "target" each row is filled by
+StudyPlanner.fill_targets, one user at a time.
+
+NumPy is optional: it is only imported when this module is used.
+"""
+from models import User, StudyPlan
+from planner import StudyPlanner
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+
+class AllocationBatch:
+    """Array-backed allocations for a batch of users (row i belongs to user_ids[i])."""
+
+    def __init__(self, user_ids: list[str], subjects: list[list], hours):
+        self.user_ids = user_ids
+        self.subjects = subjects  # Per-user Subject lists (row order of `hours`)
+        self.hours = hours        # float64 array, shape (users, max subjects), zero-padded
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def allocations(self, i: int) -> dict[str, float]:
+        """Returns {subject name: hours} for row i, like StudyPlanner.allocate_hours."""
+        subjects = self.subjects[i]
+        if not self.hours[i, :len(subjects)].any():
+            return {}
+        return {s.name: float(h) for s, h in zip(subjects, self.hours[i, :len(subjects)].tolist())}
+
+    def plan(self, i: int) -> StudyPlan:
+        """Builds the same run-length plan StudyPlanner.generate_plan would for row i."""
+        allocations = self.allocations(i)
+        if not allocations:
+            return StudyPlan()
+        return StudyPlanner.plan_from_allocations([s.name for s in self.subjects[i]], allocations)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("The vectorized planner needs NumPy. Install it with 'pip install numpy'.")
+
+
+def _row_sums(matrix):
+    """Sums each row left to right (numpy's pairwise sum can round differently from sum())."""
+    totals = matrix[:, 0].copy()
+    for column in range(1, matrix.shape[1]):
+        totals += matrix[:, column]
+    return totals
+
+
+def allocate_batch(users: list[User]) -> AllocationBatch:
+    """Computes the hour split for every user; the proportional one in one pass over padded arrays."""
+    _require_numpy()
+    users = list(users)
+    n = len(users)
+    max_subjects = max((len(u.subjects) for u in users), default=0) or 1
+    if StudyPlanner.ALLOCATION_STRATEGY == "target":
+        hours = np.zeros((n, max_subjects), dtype=np.float64)
+        for i, user in enumerate(users):
+            allocations = StudyPlanner.allocate_hours(user)
+            hours[i, :len(user.subjects)] = [allocations.get(s.name, 0.0) for s in user.subjects]
+        return AllocationBatch([u.user_id for u in users], [list(u.subjects) for u in users], hours)
+
+    max_days = max((len(u.study_slots) for u in users), default=0) or 1
+
+    weights = np.zeros((n, max_subjects), dtype=np.float64)
+    slots = np.zeros((n, max_days), dtype=np.float64)
+    counts = np.zeros(n, dtype=np.int64)
+    for i, user in enumerate(users):
+        counts[i] = len(user.subjects)
+        weights[i, :counts[i]] = [s.weight for s in user.subjects]
+        slots[i, :len(user.study_slots)] = user.study_slots
+
+    total_available = _row_sums(slots)
+    total_weight = _row_sums(weights)
+    has_subjects = np.arange(max_subjects)[None, :] < counts[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        proportional = total_available[:, None] * (weights / total_weight[:, None])
+        equal_split = total_available / counts
+
+    hours = np.where(total_weight[:, None] == 0, equal_split[:, None], proportional)
+    hours = np.where(has_subjects & (total_available != 0)[:, None], hours, 0.0)
+
+    return AllocationBatch([u.user_id for u in users], [list(u.subjects) for u in users], hours)